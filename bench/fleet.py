@@ -0,0 +1,268 @@
+"""Local stand-in device fleet for benchmarks: fake SSH CLI devices, NETCONF servers and a jump host.
+
+    python bench/fleet.py --devices 50 [--latency-ms 20] [--output-kb 64] [--jump]
+
+Each device listens on its own loopback address (127.0.<n>.<m>) so results stay per host; where
+only 127.0.0.1 is usable (macOS) all devices share it on different ports. Once listening, one JSON
+line describing the fleet is printed on stdout: {"ssh": [[ip, port], ...], "netconf": [...],
+"jump": port or null}. Any username/password is accepted. Command outputs are generated from a
+fixed seed, so every run serves the same bytes. SSH devices also take `scp -t` uploads and answer
+the IOS file commands around them (dir, verify /md5, copy, delete), enough for netmiko's
+file_transfer and bulk pushes. Runs until stdin closes or it is killed."""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import selectors
+import socket
+import sys
+import threading
+import time
+
+import paramiko
+
+NC_END = b"]]>]]>"
+NC_BASE = "urn:ietf:params:xml:ns:netconf:base:1.0"
+GET_RPC = re.compile(r"<(\w+:)?get(-config)?[\s>/]")
+FS_FREE = 64 * 1024 * 1024
+
+def running_config(host, kb, seed=7):
+    """A deterministic IOS-style running config of roughly `kb` KiB."""
+    rng, lines, i = random.Random(seed), [f"hostname {host}", "!"], 0
+    while sum(len(l) + 1 for l in lines) < kb * 1024:
+        lines += [f"interface GigabitEthernet0/{i}", f" description link-{rng.randrange(10**6):06d}",
+                  f" ip address 10.{i // 250 % 250}.{i % 250}.1 255.255.255.0", " no shutdown", "!"]
+        i += 1
+    return "\n".join(lines) + "\nend\n"
+
+def netconf_data(host, kb, seed=7):
+    rng, parts, i = random.Random(seed), [], 0
+    size = 0
+    while size < kb * 1024:
+        part = (f"<interface><name>GigabitEthernet0/{i}</name><description>link-{rng.randrange(10**6):06d}</description>"
+                "<enabled>true</enabled></interface>")
+        parts.append(part); size += len(part); i += 1
+    return (f'<data xmlns="{NC_BASE}"><system xmlns="urn:bench:system"><hostname>{host}</hostname></system>'
+            f'<interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">{"".join(parts)}</interfaces></data>')
+
+class _Server(paramiko.ServerInterface):
+    def __init__(self, jump=False):
+        self.jump, self.dests, self.subsystem = jump, {}, threading.Event()
+        self.started, self.command = threading.Event(), None
+    def check_auth_password(self, username, password): return paramiko.AUTH_SUCCESSFUL
+    def get_allowed_auths(self, username): return "password"
+    def check_channel_request(self, kind, chanid): return paramiko.OPEN_SUCCEEDED
+    def check_channel_shell_request(self, channel):
+        self.started.set(); return True
+    def check_channel_exec_request(self, channel, command):
+        if not command.startswith(b"scp -t "): return False
+        self.command = command.decode(errors="replace"); self.started.set(); return True
+    def check_channel_pty_request(self, *args): return True
+    def check_channel_subsystem_request(self, channel, name):
+        if name != "netconf": return False
+        self.subsystem.set(); return True
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        if not self.jump: return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+        self.dests[chanid] = destination; return paramiko.OPEN_SUCCEEDED
+
+class Fleet:
+    def __init__(self, devices, latency_ms=0, output_kb=16, netconf_kb=16, outputs=None, jump=False, netconf=True):
+        self.devices, self.latency = devices, latency_ms / 1000
+        self.output_kb, self.netconf_kb, self.outputs = output_kb, netconf_kb, outputs or {}
+        self.want_jump, self.want_netconf = jump, netconf
+        self.key = paramiko.RSAKey.generate(2048)
+        self.sel = selectors.DefaultSelector()
+        self.info = {'ssh': [], 'netconf': [], 'jump': None}
+        self.files = {}  # (host, file name) -> bytes uploaded over SCP
+
+    def _listen(self, addr, role, host=None):
+        ls = socket.socket()
+        ls.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        ls.bind((addr, 0)); ls.listen(128); ls.setblocking(False)
+        self.sel.register(ls, selectors.EVENT_READ, (role, host))
+        return ls.getsockname()[1]
+
+    @staticmethod
+    def _addresses(n):
+        try:
+            probe = socket.socket(); probe.bind(("127.0.1.1", 0)); probe.close()
+            return [f"127.0.{1 + i // 250}.{1 + i % 250}" for i in range(n)]
+        except OSError: return ["127.0.0.1"] * n
+
+    def start(self):
+        for i, addr in enumerate(self._addresses(self.devices)):
+            host = f"r{i + 1:04d}"
+            self.info['ssh'].append([addr, self._listen(addr, "ssh", host)])
+            if self.want_netconf: self.info['netconf'].append([addr, self._listen(addr, "netconf", host)])
+        if self.want_jump: self.info['jump'] = self._listen("127.0.0.1", "jump")
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self.info
+
+    def _accept_loop(self):
+        while True:
+            for key, _ in self.sel.select():
+                try: conn, _ = key.fileobj.accept()
+                except OSError: continue
+                conn.setblocking(True)
+                threading.Thread(target=self._handle, args=(conn,) + key.data, daemon=True).start()
+
+    def _handle(self, conn, role, host):
+        t = paramiko.Transport(conn)
+        t.add_server_key(self.key)
+        server = _Server(jump=(role == "jump"))
+        try: t.start_server(server=server)
+        except Exception: return
+        if role == "jump":
+            while t.is_active():
+                ch = t.accept(1)
+                if ch: threading.Thread(target=self._pump, args=(ch, server.dests.get(ch.get_id())), daemon=True).start()
+            return
+        ch = t.accept(20)
+        if not ch: return
+        try:
+            if role == "netconf": self._netconf(ch, host)
+            elif server.started.wait(20) and server.command: self._scp_sink(ch, host, server.command)
+            else: self._shell(ch, host)
+        except Exception: pass
+        finally:
+            try: ch.close(); t.close()
+            except Exception: pass
+
+    def _output(self, host, command):
+        if command in self.outputs: return self.outputs[command]
+        if command in ("show running-config", "show run"): return running_config(host, self.output_kb)
+        if command == "show version":
+            return f"Cisco IOS XE Software, Version 17.3.1\n{host} uptime is 5 weeks, 2 days\nProcessor board ID BENCH{host}\n"
+        if command == "show clock": return "12:00:00.000 UTC Mon Jan 1 2024\n"
+        if command.startswith(("terminal ", "term ")): return ""
+        if command.startswith(("dir ", "verify /md5 ", "copy ", "delete ")): return self._file_command(host, command)
+        return "% Invalid input detected at '^' marker.\n" if command else ""
+
+    @staticmethod
+    def _file_name(path):
+        return re.split(r"[:/]", path.strip("'\""))[-1]
+
+    def _file_command(self, host, command):
+        path = command.split()[-1] if not command.startswith("copy ") else command.split()[1]
+        name, data = self._file_name(path), self.files.get((host, self._file_name(path)))
+        if command.startswith("dir "):
+            if not name: return f"Directory of {path}/\n\n{FS_FREE * 2} bytes total ({FS_FREE} bytes free)\n"
+            if data is None: return f"%Error opening {path} (No such file or directory)\n"
+            return f"Directory of {path}\n\n    1  -rw-  {len(data)}  Jan 1 2024 12:00:00 +00:00  {name}\n"
+        if data is None: return f"%Error opening {path} (No such file or directory)\n"
+        if command.startswith("verify "): return f"verify /md5 ({path}) = {hashlib.md5(data).hexdigest()}\n"
+        if command.startswith("delete "): self.files.pop((host, name), None); return ""
+        return f"[OK]\n{len(data)} bytes copied in 0.010 secs\n"
+
+    def _scp_sink(self, ch, host, command):
+        """Receives the files of one `scp -t <path>` upload into self.files."""
+        path, buf = command.split(None, 2)[-1], b""
+        def fill(n):  # False once the client has closed the channel
+            nonlocal buf
+            while len(buf) < n:
+                d = ch.recv(65536)
+                if not d: return False
+                buf += d
+            return True
+        ch.sendall(b"\0")
+        while fill(1):
+            while b"\n" not in buf:
+                if not fill(len(buf) + 1): return
+            header, buf = buf.split(b"\n", 1)
+            if header[:1] == b"C":  # C<mode> <size> <name>; once acknowledged the bytes follow, then a NUL
+                _, size, name = header.decode(errors="replace").split(" ", 2)
+                ch.sendall(b"\0")
+                if not fill(int(size) + 1): return
+                self.files[(host, self._file_name(path) or name)], buf = buf[:int(size)], buf[int(size) + 1:]
+            ch.sendall(b"\0")
+        ch.send_exit_status(0)
+
+    def _shell(self, ch, host):
+        config, buf = False, b""
+        prompt = lambda: f"{host}(config)#" if config else f"{host}#"
+        ch.sendall(f"\r\n{prompt()}".encode())
+        while True:
+            data = ch.recv(65536)
+            if not data: return
+            buf += data
+            while b"\n" in buf or b"\r" in buf:
+                i = min(x for x in (buf.find(b"\n"), buf.find(b"\r")) if x >= 0)
+                line, sep, buf = buf[:i].decode(errors="replace").strip(), buf[i:i + 1], buf[i + 1:]
+                if sep == b"\r" and buf.startswith(b"\n"): buf = buf[1:]
+                if line in ("exit", "quit", "logout") and not config: return
+                if self.latency and line: time.sleep(self.latency)
+                if line.startswith(("configure terminal", "conf t")): config, out = True, ""
+                elif line in ("end", "exit") and config: config, out = False, ""
+                elif config: out = ""
+                else: out = self._output(host, line)
+                ch.sendall((line + "\r\n" + out.replace("\n", "\r\n") + prompt()).encode())
+
+    def _netconf(self, ch, host):
+        hello = (f'<?xml version="1.0" encoding="UTF-8"?><hello xmlns="{NC_BASE}"><capabilities>'
+                 f'<capability>{NC_BASE}</capability><capability>urn:ietf:params:netconf:capability:candidate:1.0</capability>'
+                 f'<capability>urn:ietf:params:netconf:capability:validate:1.0</capability>'
+                 f'<capability>urn:ietf:params:netconf:capability:confirmed-commit:1.0</capability>'
+                 f'</capabilities><session-id>{threading.get_ident() % 10000}</session-id></hello>')
+        ch.sendall(hello.encode() + NC_END)
+        buf, greeted, data_xml = b"", False, None
+        while True:
+            while NC_END not in buf:
+                d = ch.recv(65536)
+                if not d: return
+                buf += d
+            msg, buf = buf.split(NC_END, 1)
+            if not greeted: greeted = True; continue
+            text = msg.decode(errors="replace")
+            mid = text.split('message-id="', 1)[1].split('"', 1)[0] if 'message-id="' in text else "1"
+            if self.latency: time.sleep(self.latency)
+            if GET_RPC.search(text):
+                if data_xml is None: data_xml = netconf_data(host, self.netconf_kb)
+                body = data_xml
+            else: body = "<ok/>"
+            ch.sendall(f'<rpc-reply xmlns="{NC_BASE}" message-id="{mid}">{body}</rpc-reply>'.encode() + NC_END)
+            if re.search(r"<(\w+:)?close-session", text): return
+
+    @staticmethod
+    def _pump(ch, dest):
+        if not dest: ch.close(); return
+        try: s = socket.create_connection(dest, timeout=10)
+        except OSError: ch.close(); return
+        s.settimeout(None)
+        sel = selectors.DefaultSelector()
+        sel.register(s, selectors.EVENT_READ); sel.register(ch, selectors.EVENT_READ)
+        open_ends = 2
+        try:
+            while open_ends:
+                for key, _ in sel.select(1):
+                    src, dst = key.fileobj, (ch if key.fileobj is s else s)
+                    d = src.recv(65536)
+                    if d: dst.sendall(d); continue
+                    sel.unregister(src); open_ends -= 1
+                    if dst is ch: ch.shutdown_write()
+                    else: s.shutdown(socket.SHUT_WR)
+        except OSError: pass
+        finally: ch.close(); s.close()
+
+def main():
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--devices", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=0, help="delay before each command / RPC reply")
+    ap.add_argument("--output-kb", type=int, default=16, help="size of 'show running-config'")
+    ap.add_argument("--netconf-kb", type=int, default=16, help="size of the get-config reply")
+    ap.add_argument("--outputs", help="JSON file {command: output} overriding the built-in outputs")
+    ap.add_argument("--jump", action="store_true", help="also start a fake jump host")
+    ap.add_argument("--no-netconf", action="store_true")
+    args = ap.parse_args()
+    outputs = None
+    if args.outputs:
+        with open(args.outputs) as f: outputs = json.load(f)
+    fleet = Fleet(args.devices, args.latency_ms, args.output_kb, args.netconf_kb, outputs, args.jump, not args.no_netconf)
+    print(json.dumps(fleet.start()), flush=True)
+    try: sys.stdin.read()
+    except KeyboardInterrupt: pass
+
+if __name__ == "__main__":
+    main()
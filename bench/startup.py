@@ -0,0 +1,92 @@
+"""Startup benchmark: import time per module and time-to-first-window of the GUI.
+
+    python bench/startup.py [--runs 5] [--budget-ms 1500] [--json]
+
+Each measurement runs in a fresh interpreter, so nothing is already imported. The slowest
+modules come from `python -X importtime`. Time-to-first-window covers process start to the
+first fully drawn CollexaView and needs a display; it is skipped when none is available.
+Exits 1 when --budget-ms is given and the median time-to-first-window (or the GUI import
+time, without a display) is over budget."""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WINDOW_PROBE = """
+import time, sys
+t0 = time.perf_counter()
+import customtkinter as ctk
+from src.view_gui import CollexaView
+t_import = time.perf_counter()
+try: app = CollexaView()
+except Exception as e: print("NODISPLAY", e); sys.exit(0)
+app.update()
+t_window = time.perf_counter()
+print("TIMES", t_import - t0, t_window - t0)
+app.destroy()
+"""
+
+def run(code, *flags):
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, capture_output=True, text=True)
+
+def import_times(module):
+    """{module: cumulative microseconds} for one cold import of `module`."""
+    out = run(f"import {module}", "-X", "importtime").stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        _, cumulative, name = line.split("|")
+        try: times[name.strip()] = int(cumulative.strip())
+        except ValueError: pass
+    return times
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    result = {'python': sys.version.split()[0], 'imports_ms': {}, 'slowest_ms': {}, 'window_ms': None, 'gui_import_ms': None}
+    for module in ("src.controller", "src.cli", "src.view_gui"):
+        samples = [import_times(module).get(module, 0) / 1000 for _ in range(args.runs)]
+        result['imports_ms'][module] = round(statistics.median(samples), 1)
+    packages = [(name, us) for name, us in import_times("src.view_gui").items() if "." not in name and name != "src"]
+    result['slowest_ms'] = {name: round(us / 1000, 1) for name, us in sorted(packages, key=lambda kv: -kv[1])[:args.top]}
+
+    window, gui_import, no_display = [], [], None
+    for _ in range(args.runs):
+        out = run(WINDOW_PROBE).stdout
+        if "NODISPLAY" in out: no_display = out.split("NODISPLAY", 1)[1].strip(); break
+        for line in out.splitlines():
+            if line.startswith("TIMES"):
+                t_import, t_window = map(float, line.split()[1:])
+                gui_import.append(t_import * 1000); window.append(t_window * 1000)
+    if window:
+        result['window_ms'] = round(statistics.median(window), 1)
+        result['gui_import_ms'] = round(statistics.median(gui_import), 1)
+    elif no_display: result['window_skipped'] = no_display
+
+    if args.json: print(json.dumps(result, indent=4))
+    else:
+        print(f"Python {result['python']}, median of {args.runs} cold starts")
+        for module, ms in result['imports_ms'].items(): print(f"  import {module:<16} {ms:8.1f} ms")
+        print("  slowest top-level packages under src.view_gui:")
+        for name, ms in result['slowest_ms'].items(): print(f"    {name:<24} {ms:8.1f} ms")
+        if result['window_ms'] is not None:
+            print(f"  time to first window      {result['window_ms']:8.1f} ms (GUI imports {result['gui_import_ms']} ms)")
+        else: print(f"  time to first window      skipped ({result.get('window_skipped')})")
+
+    measured = result['window_ms'] if result['window_ms'] is not None else result['imports_ms']['src.view_gui']
+    if args.budget_ms is not None and measured > args.budget_ms:
+        print(f"OVER BUDGET: {measured} ms > {args.budget_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
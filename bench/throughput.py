@@ -0,0 +1,177 @@
+"""End-to-end throughput benchmark against the local stand-in fleet (bench/fleet.py).
+
+    python bench/throughput.py [--devices 50] [--workers 10] [--latency-ms 20] [--jump]
+                               [--scenarios ssh-retrieve,ssh-push,ssh-bulk-push,ssh-bulk-push-jump,...]
+                               [--repeat 3] [--json out.json] [--compare previous.json]
+
+Every scenario drives AppController.run() exactly like the CLI, in a scratch working directory,
+and reports the median over --repeat runs: devices/minute, wall time, failures, peak RSS growth and
+peak thread count of this process. The fleet runs in a separate process so its own threads and
+memory are not counted. Timings use the fixed 'profile' mode so learned latency cannot leak between
+runs; with the same flags the numbers can be compared commit to commit (--compare prints deltas).
+The ssh-bulk-push scenarios push with --transfer bulk (SCP upload, then one on-box copy); a device
+that fell back to line by line counts as failed. A '-jump' scenario goes through the fake jump host
+even without --jump, which routes every scenario through it."""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("ssh-retrieve", "ssh-push", "ssh-bulk-push", "ssh-bulk-push-jump", "netconf-retrieve", "netconf-push")
+SSH_TEMPLATE = "hostname {{ hostname }}\ninterface Loopback0\n description bench {{ hostname }}\n"
+NC_TEMPLATE = ('<config><system xmlns="urn:bench:system"><hostname>{{ hostname }}</hostname></system></config>')
+NC_FILTER = '<filter type="subtree"><interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces"/></filter>'
+
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"): return int(line.split()[1]) * 1024
+    except OSError: pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError: return 0
+
+class Sampler:
+    """Samples RSS and the live thread count every `interval` seconds while a scenario runs."""
+    def __init__(self, interval=0.05):
+        self.interval, self.peak_rss, self.peak_threads = interval, 0, 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.base_rss = rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True); self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+            self.peak_threads = max(self.peak_threads, threading.active_count() - 1)
+            self._stop.wait(self.interval)
+
+    def __exit__(self, *exc):
+        self._stop.set(); self._thread.join()
+
+def git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError: return None
+
+def start_fleet(args):
+    cmd = [sys.executable, os.path.join(ROOT, "bench", "fleet.py"), "--devices", str(args.devices),
+           "--latency-ms", str(args.latency_ms), "--output-kb", str(args.output_kb), "--netconf-kb", str(args.netconf_kb)]
+    if args.jump or any(s.endswith("-jump") for s in args.scenario_list): cmd.append("--jump")
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line: raise RuntimeError("fleet failed to start")
+    return proc, json.loads(line)
+
+def write_inputs(workdir, fleet, protocol):
+    devices = fleet['netconf' if protocol == "NETCONF" else 'ssh']
+    with open(os.path.join(workdir, f"inventory_{protocol}.csv"), "w") as f:
+        f.write("ip,port,hostname\n")
+        for i, (ip, port) in enumerate(devices, 1): f.write(f"{ip},{port},r{i:04d}\n")
+    for name, text in (("push.j2", SSH_TEMPLATE), ("push_nc.j2", NC_TEMPLATE), ("filter.xml", NC_FILTER)):
+        with open(os.path.join(workdir, name), "w") as f: f.write(text)
+
+def params_for(scenario, args, fleet):
+    protocol, mode = ("NETCONF" if scenario.startswith("netconf") else "SSH"), ("push" if "-push" in scenario else "retrieve")
+    return {
+        'excel': f"inventory_{protocol}.csv", 'user': "bench", 'pass': "bench", 'protocol': protocol, 'vendor': "Cisco IOS",
+        'use_jump': bool(args.jump) or scenario.endswith("-jump"), 'push_method': "bulk" if "-bulk" in scenario else "interactive", 'jh_ip': "127.0.0.1", 'jh_port': fleet['jump'] or 22, 'jh_user': "bench", 'jh_pass': "bench",
+        'mode': mode, 'cmd': args.commands, 'template': "push_nc.j2" if protocol == "NETCONF" else "push.j2",
+        'netconf_file': "filter.xml", 'format': "Text", 'auto_convert': False, 'report_format': "csv", 'export_files': False,
+        'regex_file': "", 'xpath_file': "", 'workers': args.workers, 'jump_limit': args.jump_limit,
+        'tunnel_mode': args.tunnel_mode, 'timing': "profile", 'prerender': False, 'dry_run': False
+    }
+
+def run_scenario(scenario, args, fleet):
+    from src.controller import AppController
+    samples = []
+    for _ in range(args.repeat):
+        messages = []
+        controller = AppController(messages.append)
+        with Sampler() as sampler:
+            t0 = time.perf_counter()
+            result = controller.run(params_for(scenario, args, fleet))
+            elapsed = time.perf_counter() - t0
+        fallbacks = [m for m in messages if "LINE BY LINE" in m]
+        samples.append({'elapsed': elapsed, 'failed': len(result['failed']) + len(fallbacks), 'status': result['status'],
+                        'rss_mb': max(0, sampler.peak_rss - sampler.base_rss) / 1e6, 'threads': sampler.peak_threads,
+                        'phases': (result.get('metrics') or {}).get('phases', {}),
+                        'errors': ([m for m in messages if "FAIL" in m or "ERROR" in m] + fallbacks)[:3]})
+    med = lambda key: statistics.median(s[key] for s in samples)
+    elapsed = med('elapsed')
+    return {'devices': args.devices, 'elapsed_s': round(elapsed, 3),
+            'devices_per_min': round(args.devices / elapsed * 60, 1) if elapsed else 0.0,
+            'failed': max(s['failed'] for s in samples), 'status': samples[-1]['status'],
+            'peak_rss_mb': round(med('rss_mb'), 1), 'peak_threads': max(s['threads'] for s in samples),
+            'phases_p50': {k: v['p50'] for k, v in samples[-1]['phases'].items()},
+            'errors': next((s['errors'] for s in samples if s['errors']), [])}
+
+def compare(current, previous):
+    lines = []
+    for name, cur in current['scenarios'].items():
+        prev = previous.get('scenarios', {}).get(name)
+        if not prev: continue
+        delta = lambda k: f"{(cur[k] - prev[k]) / prev[k] * 100:+.1f}%" if prev.get(k) else "n/a"
+        lines.append(f"  {name:<17} devices/min {prev['devices_per_min']:>8} -> {cur['devices_per_min']:>8} ({delta('devices_per_min')}), "
+                     f"RSS {prev['peak_rss_mb']} -> {cur['peak_rss_mb']} MB, threads {prev['peak_threads']} -> {cur['peak_threads']}")
+    return lines
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--devices", type=int, default=50)
+    ap.add_argument("--workers", type=int, default=10)
+    ap.add_argument("--latency-ms", type=float, default=20)
+    ap.add_argument("--output-kb", type=int, default=16)
+    ap.add_argument("--netconf-kb", type=int, default=16)
+    ap.add_argument("--commands", default="show version; show running-config")
+    ap.add_argument("--jump", action="store_true", help="route every session through the fake jump host")
+    ap.add_argument("--jump-limit", type=int, default=10)
+    ap.add_argument("--tunnel-mode", choices=["direct", "listener"], default="direct")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", help="write the results to this file")
+    ap.add_argument("--compare", help="previous --json output to compare against")
+    args = ap.parse_args()
+    scenarios = args.scenario_list = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown: ap.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    proc, fleet = start_fleet(args)
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory(prefix="collexa-bench-") as workdir:
+            os.chdir(workdir)
+            for protocol in ("SSH", "NETCONF"): write_inputs(workdir, fleet, protocol)
+            results = {'commit': git_commit(), 'python': sys.version.split()[0], 'platform': sys.platform,
+                       'config': {k: v for k, v in vars(args).items() if k not in ('json', 'compare')}, 'scenarios': {}}
+            for scenario in scenarios:
+                results['scenarios'][scenario] = r = run_scenario(scenario, args, fleet)
+                print(f"{scenario:<17} {r['devices_per_min']:>8} devices/min  {r['elapsed_s']:>7}s  failed {r['failed']:<3} "
+                      f"RSS +{r['peak_rss_mb']} MB  threads {r['peak_threads']}", flush=True)
+                for line in r['errors']: print(f"    {line}")
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        proc.stdin.close(); proc.terminate(); proc.wait()
+
+    if args.json:
+        with open(args.json, "w") as f: json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f: previous = json.load(f)
+        print(f"vs {previous.get('commit')}:")
+        for line in compare(results, previous): print(line)
+    return 1 if any(r['failed'] or r['status'] != 'ok' for r in results['scenarios'].values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,13 @@
-from src.view_gui import CollexaView
-import customtkinter as ctk
+import sys
+import multiprocessing
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        from src.cli import main
+        sys.exit(main())
+    import customtkinter as ctk
+    from src.view_gui import CollexaView
     ctk.set_appearance_mode("Dark")
     app = CollexaView()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
@@ -0,0 +1,91 @@
+import os
+import re
+import uuid
+import tempfile
+from .configdiff import SKIP_LINES
+
+PUSH_METHODS = ("interactive", "bulk", "auto")
+BULK_MIN_LINES = 200  # 'auto' only transfers configs at least this long
+
+# device_type -> where the file goes and how it is applied. 'apply' runs from exec mode; 'load'
+# runs in config mode and is followed by a commit. Platforms not listed are pushed line by line.
+BULK_PROFILES = {
+    'cisco_ios':     {'fs': "flash:",     'path': "flash:{name}",     'apply': "copy {path} running-config", 'cleanup': "delete /force {path}"},
+    'cisco_xe':      {'fs': "flash:",     'path': "flash:{name}",     'apply': "copy {path} running-config", 'cleanup': "delete /force {path}"},
+    'cisco_nxos':    {'fs': "bootflash:", 'path': "bootflash:{name}", 'apply': "copy {path} running-config", 'cleanup': "delete {path} no-prompt"},
+    'arista_eos':    {'fs': "flash:",     'path': "flash:{name}",     'apply': "copy {path} running-config", 'cleanup': "delete {path}"},
+    'cisco_xr':      {'fs': "disk0:",     'path': "disk0:{name}",     'load': "load {path}",                 'discard': "clear",      'cleanup': "delete /noprompt {path}"},
+    'juniper_junos': {'fs': "/var/tmp",   'path': "/var/tmp/{name}",  'load': "load merge {path}",           'discard': "rollback 0", 'cleanup': "file delete {path}"},
+    'nokia_sros':    {'fs': "cf3:",       'path': "cf3:/{name}",      'apply': "exec {path}",                'cleanup': "file delete {path} force"},
+}
+APPLY_ERRORS = re.compile(r"% ?(invalid|incomplete|ambiguous|failed)|syntax error|error:|minor:", re.I)
+CONFIRM = re.compile(r"(\?|\[confirm\]|\[y/n\])\s*$", re.I)
+
+class TransferError(Exception):
+    """The config file could not be placed on the device; nothing has been applied yet."""
+
+def bulk_profile(device_type):
+    return BULK_PROFILES.get(str(device_type).replace("_ssh", ""))
+
+def use_bulk(method, device_type, n_lines):
+    """'bulk' transfers whenever the platform supports it, 'auto' only for long configs."""
+    if method not in ("bulk", "auto") or not bulk_profile(device_type): return False
+    return method == "bulk" or n_lines >= BULK_MIN_LINES
+
+def _confirming(net_connect, command, read_timeout):
+    output = chunk = net_connect.send_command_timing(command, read_timeout=read_timeout)
+    for _ in range(3):  # answer 'Destination filename [running-config]?' style prompts with the default
+        if not CONFIRM.search(chunk): break
+        chunk = net_connect.send_command_timing("\n", read_timeout=read_timeout)
+        output += chunk
+    return output
+
+def transfer(net_connect, profile, lines, read_timeout, reopen=None):
+    """Copies the config to the device over SCP and returns its on-box path. netmiko runs SCP as
+    a second SSH login from the session's host/port/sock, which behind a jump host would be the
+    session's own jump channel or its single-use forward; `reopen()` gives that login connection
+    params of its own (a new jump channel 'sock', or a new forward host/port)."""
+    from netmiko import file_transfer
+    name = f"collexa_{uuid.uuid4().hex[:8]}.cfg"
+    fd, local = tempfile.mkstemp(suffix=".cfg")
+    session = (net_connect.host, net_connect.port, net_connect.sock)
+    try:
+        with os.fdopen(fd, 'w') as f: f.write("\n".join(l for l in lines if l.strip() not in SKIP_LINES) + "\n")
+        if reopen:
+            fresh = reopen()
+            net_connect.host, net_connect.port, net_connect.sock = fresh['host'], int(fresh['port']), fresh.get('sock')
+        file_transfer(net_connect, source_file=local, dest_file=name, file_system=profile['fs'],
+                      direction='put', overwrite_file=True, socket_timeout=float(read_timeout))
+    except Exception as e: raise TransferError(str(e) or type(e).__name__)
+    finally:
+        net_connect.host, net_connect.port, net_connect.sock = session
+        os.remove(local)
+    return profile['path'].format(name=name)
+
+def bulk_push(net_connect, device_type, lines, read_timeout=90, reopen=None):
+    """Transfers `lines` as one file and applies it with a single on-box copy, or load + commit.
+    Raises TransferError when the file never reached the device (safe to push line by line);
+    returns (ok, output) once applying was attempted. `reopen`: see transfer."""
+    profile = bulk_profile(device_type)
+    path = transfer(net_connect, profile, lines, read_timeout, reopen)
+    try:
+        if 'apply' in profile: output = _confirming(net_connect, profile['apply'].format(path=path), read_timeout)
+        else:
+            load = profile['load']
+            if device_type.startswith("juniper") and all(l.split()[0] in ("set", "delete", "deactivate", "activate") for l in lines if l.strip()):
+                load = "load set {path}"
+            net_connect.config_mode()
+            committed = False
+            try:
+                output = net_connect.send_command_timing(load.format(path=path), read_timeout=read_timeout)
+                if not APPLY_ERRORS.search(output):
+                    output += net_connect.commit(read_timeout=read_timeout); committed = True
+            finally:
+                if not committed: net_connect.send_command_timing(profile['discard'])
+                net_connect.exit_config_mode()
+    except Exception as e: return False, f"Bulk apply of {path} failed: {e}"
+    finally:
+        try: _confirming(net_connect, profile['cleanup'].format(path=path), read_timeout)
+        except Exception: pass
+    if APPLY_ERRORS.search(output): return False, output
+    return True, output
@@ -0,0 +1,149 @@
+import argparse
+import getpass
+import json
+import os
+import signal
+import sys
+
+# Exit codes
+EXIT_OK, EXIT_DEVICE_FAILED, EXIT_USAGE, EXIT_ABORTED, EXIT_REPORT_FAILED = 0, 1, 2, 3, 4
+
+DEFAULTS = {
+    'excel': '', 'user': '', 'pass': '', 'protocol': 'SSH', 'vendor': 'Cisco IOS',
+    'use_jump': False, 'jh_ip': '', 'jh_port': 22, 'jh_user': '', 'jh_pass': '',
+    'mode': 'retrieve', 'cmd': '', 'template': '', 'netconf_file': '',
+    'format': 'JSON', 'auto_convert': True, 'report_format': 'xlsx', 'export_files': False,
+    'regex_file': '', 'xpath_file': '', 'workers': None, 'jump_limit': None, 'jump_transports': None, 'jump_groups': {},
+    'netconf_target': 'auto', 'confirm_timeout': 0, 'push_diff': 'off', 'push_method': 'interactive', 'device_timeout': None,
+    'autodetect': False, 'detect_ttl': None,
+    'tunnel_mode': 'direct', 'timing': 'adaptive', 'prerender': False, 'dry_run': False, 'metrics_hook': ''
+}
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="collexa", description="Collexa NetDeploy headless runner. Builds the same job the GUI "
+                                 "runs, from a job file (JSON/YAML, keys as in the GUI params) and/or flags; flags win.",
+                                 epilog="Passwords come from COLLEXA_PASSWORD / COLLEXA_JUMP_PASSWORD, --saved-creds, or a prompt. "
+                                 "Ctrl-C cancels the run (sessions are aborted, --resume continues it); a second Ctrl-C exits. "
+                                 "Exit codes: 0 ok, 1 device failures, 2 bad job, 3 run aborted or cancelled, 4 report failed.")
+    ap.add_argument("--job", help="job file (.json, .yaml)")
+    ap.add_argument("--mode", choices=["retrieve", "push"])
+    ap.add_argument("-i", "--inventory", dest="excel", help="device list (.xlsx/.csv/.yaml)")
+    ap.add_argument("-u", "--user")
+    ap.add_argument("--saved-creds", action="store_true", help="use the credentials saved from the GUI")
+    ap.add_argument("--protocol", choices=["SSH", "NETCONF"])
+    ap.add_argument("--vendor", help="default platform, e.g. 'Cisco IOS', 'Juniper Junos'")
+    ap.add_argument("--autodetect", action="store_true", default=None,
+                    help="rows without a device_type get the driver cached for the host, or are probed once and cached")
+    ap.add_argument("--detect-ttl", type=float, metavar="DAYS", help="re-probe cached platforms older than this (default 30)")
+    ap.add_argument("-c", "--commands", dest="cmd", help="commands separated by ';' or a .txt file")
+    ap.add_argument("-t", "--template")
+    ap.add_argument("--filter", dest="netconf_file", help="NETCONF filter(s) (.xml/.json), ';'-separated, 'get:' prefix for state data")
+    ap.add_argument("--diff", dest="push_diff", choices=["off", "cache", "running"],
+                    help="push only what changed: 'cache' skips hosts whose last pushed config is identical, "
+                    "'running' sends only the lines missing from the running config (SSH)")
+    ap.add_argument("--transfer", dest="push_method", choices=["interactive", "bulk", "auto"],
+                    help="SSH push: 'bulk' copies the config to the device over SCP and applies it on the box, 'auto' "
+                    "does so for long configs; platforms without file transfer are pushed line by line (default interactive)")
+    ap.add_argument("--datastore", dest="netconf_target", choices=["auto", "running", "candidate"],
+                    help="NETCONF push target; candidate is validated and committed (default auto)")
+    ap.add_argument("--confirm-timeout", type=int, help="NETCONF confirmed-commit timeout in seconds; confirmed only after a new session reaches the device, otherwise it rolls back")
+    ap.add_argument("--format", choices=["JSON", "XML", "Text"])
+    ap.add_argument("--regex", dest="regex_file")
+    ap.add_argument("--xpath", dest="xpath_file")
+    ap.add_argument("--report-format", choices=["xlsx", "csv", "parquet"])
+    ap.add_argument("--no-report", dest="auto_convert", action="store_false", default=None)
+    ap.add_argument("--export-files", action="store_true", default=None)
+    ap.add_argument("-w", "--workers", type=int)
+    ap.add_argument("--jump", help="default jump host HOST[:PORT][,HOST[:PORT]...] (a 'jump' inventory column overrides it per row)")
+    ap.add_argument("--jump-group", action="append", metavar="NAME=HOST[:PORT],...", help="named jump group for the 'jump' column")
+    ap.add_argument("--jump-user", dest="jh_user")
+    ap.add_argument("--jump-limit", type=int, help="max concurrent sessions per jump host")
+    ap.add_argument("--jump-transports", type=int, help="SSH transports kept open per jump host (default 2)")
+    ap.add_argument("--tunnel-mode", choices=["direct", "listener"])
+    ap.add_argument("--device-timeout", type=int, metavar="SECONDS",
+                    help="wall-clock deadline per device covering tunnel, connect and execute (default 600, 0 = none)")
+    ap.add_argument("--timing", choices=["adaptive", "profile", "conservative"], help="netmiko timings (default adaptive)")
+    ap.add_argument("--metrics-hook", help="module:function called with every timing span and the run summary")
+    ap.add_argument("--prerender", action="store_true", default=None)
+    ap.add_argument("--dry-run", action="store_true", default=None)
+    resume = ap.add_mutually_exclusive_group()
+    resume.add_argument("--resume", nargs="?", const="last", metavar="RUN_ID",
+                        help="continue a journaled run (default: the last one), skipping devices that finished")
+    resume.add_argument("--retry-failed", nargs="?", const="last", metavar="RUN_ID", help="rerun only the failed devices of a run")
+    ap.add_argument("--force", action="store_true", help="resume even though input files changed since the run started")
+    ap.add_argument("-q", "--quiet", action="store_true", help="only print run-level lines and failures")
+    return ap
+
+def load_job(path):
+    with open(path, 'r') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            try: import yaml
+            except ImportError: raise RuntimeError("YAML job files need PyYAML (pip install pyyaml)")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+def build_params(args, cred_mgr=None):
+    """Defaults < job file < flags, then passwords from the environment, saved creds or a prompt."""
+    p = dict(DEFAULTS)
+    if args.job: p.update(load_job(args.job))
+    if args.resume or args.retry_failed:
+        from .journal import RunJournal
+        p.update(RunJournal.resume_params(args.resume or args.retry_failed, retry=bool(args.retry_failed)), resume_force=args.force)
+    flags = {k: v for k, v in vars(args).items()
+             if v is not None and k not in ('job', 'jump', 'jump_group', 'saved_creds', 'quiet', 'resume', 'retry_failed', 'force')}
+    p.update(flags)
+    if args.jump: p.update(use_jump=True, jh_ip=args.jump)
+    for group in args.jump_group or []:
+        name, sep, members = group.partition("=")
+        if not sep or not name.strip() or not members.strip(): raise ValueError(f"Bad --jump-group '{group}' (use NAME=HOST[:PORT],...)")
+        p['jump_groups'] = dict(p['jump_groups'] or {}, **{name.strip(): members})
+    if args.prerender or args.dry_run: p['prerender'] = True
+
+    if args.saved_creds and cred_mgr:
+        u, pw = cred_mgr.load_credentials('main')
+        if u and p['user'] in ('', u): p['user'], p['pass'] = u, p['pass'] or pw
+        ju, jpw = cred_mgr.load_credentials('jump')
+        if ju and p['jh_user'] in ('', ju): p['jh_user'], p['jh_pass'] = ju, p['jh_pass'] or jpw
+    p['pass'] = p['pass'] or os.environ.get('COLLEXA_PASSWORD', '')
+    p['jh_pass'] = p['jh_pass'] or os.environ.get('COLLEXA_JUMP_PASSWORD', '')
+    if not p['pass'] and not p.get('dry_run') and sys.stdin.isatty(): p['pass'] = getpass.getpass(f"Password for {p['user']}: ")
+    if (p['use_jump'] or p['jump_groups']) and not p['jh_pass'] and not p.get('dry_run') and sys.stdin.isatty():
+        p['jh_pass'] = getpass.getpass(f"Jump host password for {p['jh_user']}: ")
+    return p
+
+def validate(p):
+    if not p['excel']: return "No inventory given (--inventory or 'excel' in the job file)."
+    if not p['user'] and not p.get('dry_run'): return "No username given (--user or --saved-creds)."
+    if p['mode'] == 'retrieve' and p['protocol'] == 'SSH' and not p['cmd'] and not p.get('dry_run'):
+        return "No commands given (--commands)."
+    if p['mode'] == 'retrieve' and p['protocol'] == 'NETCONF' and not p['netconf_file']: return "No NETCONF filter given (--filter)."
+    if p['mode'] == 'push' and not p['template']: return "No template given (--template)."
+    return None
+
+def exit_code(result):
+    if result['status'] in ('ok', 'dry_run'):
+        if result['failed']: return EXIT_DEVICE_FAILED
+        if result['report'] and not result['report'][0]: return EXIT_REPORT_FAILED
+        return EXIT_OK
+    return EXIT_USAGE if result['status'] == 'plan_error' else EXIT_ABORTED
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    from .controller import AppController
+    quiet = args.quiet
+    def log(msg):
+        if quiet and msg.startswith("[") and not any(w in msg for w in ("FAIL", "ERR")): return
+        print(msg, flush=True)
+    controller = AppController(log)
+    try: params = build_params(args, controller.cred_mgr)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Job error: {e}", file=sys.stderr); return EXIT_USAGE
+    problem = validate(params)
+    if problem:
+        print(problem, file=sys.stderr); return EXIT_USAGE
+    def interrupt(*_):
+        if not controller.cancel(): raise KeyboardInterrupt
+    signal.signal(signal.SIGINT, interrupt)
+    result = controller.run(params)
+    if result['failed']: print(f"Failed devices ({len(result['failed'])}): {', '.join(sorted(result['failed']))}", file=sys.stderr)
+    return exit_code(result)
@@ -0,0 +1,85 @@
+import os
+import time
+import hashlib
+from .jsoncache import JsonCache
+
+PUSHED_FILE = os.path.join(".collexa_cache", "pushed.json")
+PUSH_DIFF_MODES = ("off", "cache", "running")
+
+RUNNING_CONFIG_COMMANDS = {
+    'default':       "show running-config",
+    'juniper_junos': "show configuration | display set",
+    'huawei':        "display current-configuration",
+    'nokia_sros':    "admin display-config",
+}
+SKIP_LINES = ("end", "configure terminal", "conf t", "return")
+
+def running_config_command(device_type):
+    return RUNNING_CONFIG_COMMANDS.get(str(device_type).replace("_ssh", ""), RUNNING_CONFIG_COMMANDS['default'])
+
+def _tree(text):
+    """Indented config text -> [(line, children)], ignoring blanks, '!'/'#' comments and mode
+    switches. Lines are whitespace-normalized so spacing differences do not count as changes."""
+    root = []
+    stack = [(-1, root)]
+    for raw in str(text).splitlines():
+        line = " ".join(raw.split())
+        if not line or line.startswith(("!", "#")) or line in SKIP_LINES: continue
+        indent = len(raw) - len(raw.lstrip())
+        while stack[-1][0] >= indent: stack.pop()
+        node = (line, [])
+        stack[-1][1].append(node)
+        stack.append((indent, node[1]))
+    return root
+
+def _present(line, have):
+    if line in have: return True
+    # 'no X' is already satisfied when X is not configured
+    return line.startswith("no ") and line[3:] not in have
+
+def _delta(want, have, depth):
+    have_map = {line: children for line, children in have}
+    out, opened = [], False
+    for line, children in want:
+        if line.startswith("exit") and not children:
+            # mode exits (exit-address-family, ...) only follow a block that is being sent
+            if opened: out.append(" " * depth + line); opened = False
+            continue
+        if not _present(line, have_map):
+            out += _lines(line, children, depth); opened = True
+            continue
+        sub = _delta(children, have_map.get(line, []), depth + 1)
+        if sub: out += [" " * depth + line] + sub; opened = True
+    return out
+
+def _lines(line, children, depth):
+    out = [" " * depth + line]
+    for l, c in children: out += _lines(l, c, depth + 1)
+    return out
+
+def config_delta(desired, running):
+    """Lines of `desired` missing from `running` (both CLI config text), with the parent lines
+    needed to reach them. Empty when the device already has everything."""
+    return _delta(_tree(desired), _tree(running), 0)
+
+def config_digest(protocol, config):
+    """Stable hash of a rendered config, insensitive to blank lines and trailing spaces."""
+    lines = [l.rstrip() for l in str(config).splitlines() if l.strip()]
+    return hashlib.sha256((protocol + "\n" + "\n".join(lines)).encode('utf-8')).hexdigest()
+
+class PushCache(JsonCache):
+    """Hash of the config last pushed successfully to each host, persisted as JSON."""
+    def __init__(self, path=PUSHED_FILE):
+        super().__init__(path)
+
+    def matches(self, host, digest):
+        with self._lock: return self.hosts.get(host, {}).get('sha') == digest
+
+    def record(self, host, digest):
+        with self._lock:
+            self.hosts[host] = {'sha': digest, 'ts': int(time.time())}
+            self._dirty = True
+
+    def forget(self, host):
+        with self._lock:
+            if self.hosts.pop(host, None): self._dirty = True
@@ -1,18 +1,168 @@
 import threading
-import json
 import os
-from .models import CredentialManager, TunnelManager, NetworkRunner, ReportGenerator
-import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .models import CredentialManager, TunnelPool, NetworkRunner, ReportGenerator
+from .inventory import InventoryReader
+from .store import ResultsStore, RESULTS_DB
+from .runlog import RunLog, load_hook
+from .timing import TimingPolicy
+from .configdiff import PushCache, PUSH_DIFF_MODES, config_digest
+from .journal import RunJournal
+from .bulkpush import PUSH_METHODS, BULK_MIN_LINES, bulk_profile
+from .deadline import Watchdog, DeviceAborted, DEFAULT_DEVICE_TIMEOUT
+from .platforms import PlatformCache, driver_mismatch, DEFAULT_DETECT_TTL_DAYS
 
 VENDOR_MAP = {
     "Cisco IOS": "cisco_ios", "Cisco XR": "cisco_xr", "Cisco NX-OS": "cisco_nxos",
     "Juniper Junos": "juniper_junos", "Nokia SR OS": "nokia_sros", "Huawei VRP": "huawei"
 }
 
+DEFAULT_WORKERS = 10
+DEFAULT_JUMP_LIMIT = 5
+DEFAULT_JUMP_TRANSPORTS = 2
+NO_JUMP = ("none", "direct", "-")
+NETCONF_TARGETS = ("auto", "running", "candidate")
+DEFAULT_TUNNEL_BUFFER = 65536
+LISTENER_ONLY_SUFFIXES = ("_telnet", "_serial")
+RENDER_DIR = "rendered"
+RESULTS_DIR = "results"
+
+class RunPlan:
+    """Everything shared by a run, resolved and validated once before the first connection:
+    commands, NETCONF operations, compiled template and output paths. Inventory rows are turned
+    into per-device connection dicts by resolve(), so workers only perform I/O."""
+    def __init__(self, p):
+        self.params = p
+        self.mode, self.protocol = p['mode'], p['protocol']
+        self.workers = max(1, int(p.get('workers') or DEFAULT_WORKERS))
+        self.jump_limit = max(1, int(p.get('jump_limit') or DEFAULT_JUMP_LIMIT))
+        self.jump_transports = max(1, int(p.get('jump_transports') or DEFAULT_JUMP_TRANSPORTS))
+        self.jump_groups = p.get('jump_groups') or {}
+        self.default_jump = str(p['jh_ip']).strip() or None if p['use_jump'] else None
+        self.default_type = VENDOR_MAP.get(p['vendor'], 'cisco_ios')
+        self.default_port = 830 if self.protocol == "NETCONF" else 22
+        self.ext = "xml" if self.protocol == "NETCONF" else {"JSON": "json", "XML": "xml"}.get(p['format'], "txt")
+        self.results_dir = RESULTS_DIR
+        self.export_files = bool(p.get('export_files'))
+        self.commands, self.netconf_ops, self.rendered = [], None, None
+        self.store, self.run_id, self.runlog = None, None, None
+        self.journal, self.resumed, self.errors = None, False, {}
+        self.failed, self.skipped = [], []
+        self.cancel, self.watchdog = None, None
+        timeout = p.get('device_timeout')
+        self.device_timeout = DEFAULT_DEVICE_TIMEOUT if timeout in (None, "") else max(0, int(timeout))
+        self.platforms = PlatformCache(ttl_days=p.get('detect_ttl') or DEFAULT_DETECT_TTL_DAYS) if p.get('autodetect') else None
+        self.spool_dir = os.path.join(RESULTS_DIR, ".spool")
+        self.timing = TimingPolicy(p.get('timing') or 'adaptive')
+
+        if self.mode == 'retrieve' and self.protocol == "SSH":
+            self.commands = NetworkRunner.load_commands(p['cmd'])
+        elif self.mode == 'retrieve' and self.protocol == "NETCONF":
+            self.netconf_ops = self._load_ops(p['netconf_file'])
+        elif self.mode == 'push':
+            if not p.get('template') or not os.path.isfile(p['template']): raise ValueError(f"Template not found: {p.get('template')}")
+            path = os.path.abspath(p['template'])
+            NetworkRunner.template_env(os.path.dirname(path)).get_template(os.path.basename(path))
+        self.netconf_target = p.get('netconf_target') or "auto"
+        if self.netconf_target not in NETCONF_TARGETS: raise ValueError(f"Unknown NETCONF target '{self.netconf_target}' (use {', '.join(NETCONF_TARGETS)})")
+        self.confirm_timeout = int(p.get('confirm_timeout') or 0)
+        self.push_diff = p.get('push_diff') or "off"
+        if self.push_diff not in PUSH_DIFF_MODES: raise ValueError(f"Unknown diff mode '{self.push_diff}' (use {', '.join(PUSH_DIFF_MODES)})")
+        self.pushed = PushCache() if self.mode == 'push' and self.push_diff != "off" else None
+        self.push_method = p.get('push_method') or "interactive"
+        if self.push_method not in PUSH_METHODS: raise ValueError(f"Unknown push method '{self.push_method}' (use {', '.join(PUSH_METHODS)})")
+        self.outcomes = []
+
+        if self.mode == 'retrieve': os.makedirs(self.spool_dir, exist_ok=True)
+
+    @staticmethod
+    def _load_ops(source):
+        """Reads the NETCONF filters once (see NetworkRunner.load_netconf_ops)."""
+        try: ops = NetworkRunner.load_netconf_ops(source)
+        except Exception as e: raise ValueError(f"Filter error: {e}")
+        if not ops: raise ValueError("Filter error: no NETCONF filter given")
+        return ops
+
+    def resolve(self, row):
+        """Compact inventory record -> device dict with its ready-to-use connection params."""
+        host = str(row.get('ip') or row.get('host'))
+        dtype, platform = row.get('device_type'), 'row'
+        hint = self.platforms.get(host) if self.platforms else None
+        if not dtype or dtype == "autodetect":
+            # autodetect: a cached driver resolves at once, unknown SSH hosts are probed by the worker
+            if hint and hint.get('device_type'): dtype, platform = hint['device_type'], 'cache'
+            else: dtype, platform = self.default_type, 'probe' if self.platforms and self.protocol == "SSH" else None
+        port = int(row.get('port') or self.default_port)
+        jump = row.get('jump') or row.get('jump_host') or self.default_jump
+        if jump and str(jump).lower() in NO_JUMP: jump = None
+        p = self.params
+        timing, read_timeout = None, None
+        if self.protocol == "SSH":
+            timing, settings = self.timing.for_device(dtype, host)
+            read_timeout = settings.pop('read_timeout')
+            conn = {'device_type': dtype, 'host': host, 'username': p['user'], 'password': p['pass'], 'port': port, **settings}
+        else:
+            conn = {'host': host, 'username': p['user'], 'password': p['pass'], 'port': port,
+                    'device_params': {'name': (hint or {}).get('netconf') or 'default'}}
+        row_cmds = row.get('commands')
+        commands = NetworkRunner.load_commands(row_cmds) if isinstance(row_cmds, str) else self.commands
+        return {'host': host, 'port': port, 'device_type': dtype, 'row': row, 'commands': commands, 'conn': conn,
+                'timing': timing, 'read_timeout': read_timeout, 'jump': jump and str(jump), 'platform': platform}
+
+    def summary(self, devices=None):
+        """Printable plan. Device counts are only known when the inventory was read up front."""
+        p = self.params
+        if devices is None: lines = [f"PLAN: {self.mode.upper()} over {self.protocol}, streaming inventory {p['excel']}"]
+        else:
+            types = {}
+            for d in devices: types[d['device_type']] = types.get(d['device_type'], 0) + 1
+            lines = [f"PLAN: {self.mode.upper()} over {self.protocol}, {len(devices)} devices ("
+                     + ", ".join(f"{t}: {n}" for t, n in sorted(types.items())) + ")"]
+        if self.mode == 'retrieve' and self.protocol == "SSH":
+            overrides = sum(1 for d in devices or [] if d['commands'] is not self.commands)
+            lines.append(f"  Commands: {len(self.commands)}" + (f" (per-row overrides: {overrides})" if overrides else ""))
+        if self.netconf_ops: lines.append(f"  Filter: {p['netconf_file']} ({', '.join(f'{name}: {len(x)} chars' for name, _, x in self.netconf_ops)}, one session per device)")
+        if self.mode == 'push' and self.protocol == "NETCONF":
+            lines.append(f"  Datastore: {self.netconf_target}" + (f", confirmed commit {self.confirm_timeout}s, confirmed once a new session answers" if self.confirm_timeout else ""))
+        if self.pushed:
+            how = {'cache': "skip hosts whose last successful push had the same config",
+                   'running': "send only lines missing from the running config" if self.protocol == "SSH" else "cached hash (no NETCONF delta)"}
+            lines.append(f"  Diff: {self.push_diff}, {how[self.push_diff]} ({len(self.pushed.hosts)} hosts cached)")
+        if self.mode == 'push' and self.protocol == "SSH" and self.push_method != "interactive":
+            bulk = sum(1 for d in devices or [] if bulk_profile(d['device_type']))
+            lines.append(f"  Transfer: {self.push_method}, file copy + on-box apply"
+                         + (f" for configs of {BULK_MIN_LINES}+ lines" if self.push_method == "auto" else "")
+                         + (f" ({bulk}/{len(devices)} devices support it, the rest line by line)" if devices is not None else ""))
+        if self.mode == 'push':
+            lines.append(f"  Template: {p['template']}" + (f" (pre-rendered {len(self.rendered)})" if self.rendered else ""))
+        else: lines.append(f"  Output: {RESULTS_DB}" + (f" + {self.results_dir}/*.{self.ext}" if self.export_files else ""))
+        if self.platforms:
+            sources = {}
+            for d in devices or []: sources[d['platform']] = sources.get(d['platform'], 0) + 1
+            lines.append(f"  Platform: autodetect, {len(self.platforms.hosts)} hosts cached (expire after {self.platforms.ttl / 86400:g} d)"
+                         + (" [" + ", ".join(f"{k}: {n}" for k, n in sorted(sources.items()) if k) + "]" if sources else ""))
+        if self.protocol == "SSH":
+            counts = {}
+            for d in devices or []: counts[d['timing']] = counts.get(d['timing'], 0) + 1
+            lines.append(f"  Timing: {self.timing.describe()}" + (" [" + ", ".join(f"{t}: {n}" for t, n in sorted(counts.items())) + "]" if counts else ""))
+        lines.append(f"  Workers: {self.workers}" + (f", jump host {self.default_jump}" if self.default_jump else "")
+                     + (f", {self.device_timeout}s deadline per device" if self.device_timeout else ", no device deadline"))
+        jumps = {}
+        for d in devices or []:
+            if d['jump']: jumps[d['jump']] = jumps.get(d['jump'], 0) + 1
+        if self.default_jump or self.jump_groups or jumps:
+            lines.append(f"  Jump: max {self.jump_limit} sessions and {self.jump_transports} transports per bastion, {p.get('tunnel_mode', 'direct')}"
+                         + (f", groups {', '.join(self.jump_groups)}" if self.jump_groups else "")
+                         + (" [" + ", ".join(f"{j}: {n}" for j, n in sorted(jumps.items())) + "]" if jumps else ""))
+        return lines
+
 class AppController:
     def __init__(self, view_log_callback):
-        self.log = view_log_callback
+        self.ui_log = view_log_callback
         self.cred_mgr = CredentialManager()
+        self._cancel = threading.Event()
+        self._thread = None
 
     def load_creds(self):
         return {
@@ -24,93 +174,422 @@ class AppController:
         self.cred_mgr.save_credentials(section, u, p)
 
     def run_task(self, params):
-        threading.Thread(target=self._execute, args=(params,), daemon=True).start()
+        self._thread = threading.Thread(target=self._execute, args=(params,), daemon=True)
+        self._thread.start()
+
+    def busy(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def cancel(self):
+        """Stops the current run from any thread: no new device is started, sessions in flight are
+        aborted and their tunnels released. Returns False when a cancel was already requested."""
+        if self._cancel.is_set(): return False
+        self._cancel.set()
+        self.ui_log("Cancelling run...")
+        return True
+
+    def run(self, params):
+        """Runs a job in the calling thread and returns its outcome: {'status': 'ok' | 'plan_error' |
+        'jump_error' | 'error' | 'dry_run' | 'cancelled', 'devices', 'failed': [hosts], 'report': (ok, msg) or None,
+        'run_id', 'log', 'metrics' (the run summary, once devices ran), 'changes' (push only: changed /
+        unchanged / failed counts)}."""
+        return self._execute(params)
+
+    def log(self, msg, runlog=None, host=None):
+        """Hands a line to the view's log sink and to the run's structured log."""
+        self.ui_log(f"[{host}] {msg}" if host else msg)
+        if runlog: runlog.message(msg, host)
+
+    @staticmethod
+    def _phase(plan, host, phase, t0, ok, detail=None):
+        if host and not ok and detail is not None: plan.errors[host] = detail
+        if plan.runlog: plan.runlog.phase(host, phase, "ok" if ok else "fail", time.monotonic() - t0, None if ok else detail, start=t0)
+
+    @staticmethod
+    def _session_spans(plan, host, t0, timings):
+        """Splits a device session into its measured connect (incl. auth), prompt and execute spans."""
+        if not plan.runlog: return
+        for name in ('connect', 'prompt', 'execute'):
+            if timings.get(name) is None: continue
+            plan.runlog.phase(host, name, "ok", timings[name], start=t0)
+            t0 += timings[name]
 
     def _execute(self, p):
-        self.log(f"--- STARTING {p['mode'].upper()} ---")
-        tunnel = None
-        
-        # 1. Jump Host
-        if p['use_jump']:
-            self.log(f"Connecting to Jump Host {p['jh_ip']}...")
-            tunnel = TunnelManager(p['jh_ip'], p['jh_port'], p['jh_user'], p['jh_pass'])
-            ok, msg = tunnel.connect()
-            if not ok:
-                self.log(f"Jump Error: {msg}")
-                return
-            self.log("Jump Host Connected.")
-
-        # 2. Process Devices
+        self._cancel.clear()
+        runlog = RunLog(p['mode'])
+        log = lambda msg: self.log(msg, runlog)
+        log(f"--- STARTING {p['mode'].upper()} ---")
+        if p.get('metrics_hook'):
+            try: runlog.hook = load_hook(p['metrics_hook'])
+            except Exception as e: log(f"Metrics hook not loaded: {e}")
+        tunnel, plan = None, None
+        result = {'status': 'error', 'devices': 0, 'failed': [], 'report': None, 'run_id': None, 'log': runlog.path}
         try:
-            df = pd.read_excel(p['excel'])
-            df.columns = [str(c).strip().replace(" ", "_").lower() for c in df.columns]
-            
-            for _, row in df.iterrows():
-                row_data = row.to_dict()
-                host = row_data.get('ip') or row_data.get('host')
-                if not host: continue
-                
-                # Tunnel Setup
-                c_host, c_port = host, int(row_data.get('port', 830 if p['protocol'] == "NETCONF" else 22))
-                if tunnel:
-                    try:
-                        self.log(f"Tunneling to {host}...")
-                        c_port = tunnel.start_forwarding(host, c_port)
-                        c_host = "127.0.0.1"
-                    except Exception as e:
-                        self.log(f"Tunnel Error {host}: {e}"); continue
-                
-                # Execution
-                self.log(f"Processing {host}...")
-                dtype = row_data.get('device_type', VENDOR_MAP.get(p['vendor'], 'cisco_ios'))
-                
-                if p['protocol'] == "SSH":
-                    dev = {'device_type': dtype, 'host': c_host, 'username': p['user'], 'password': p['pass'], 'port': c_port}
-                    if p['mode'] == 'retrieve':
-                        ok, res = NetworkRunner.retrieve_ssh(dev, p['cmd'], p['format'])
-                        if ok:
-                            ext = "json" if p['format']=="JSON" else "xml" if p['format']=="XML" else "txt"
-                            if not os.path.exists("results"): os.makedirs("results")
-                            with open(f"results/{host}.{ext}", "w") as f: f.write(res)
-                            self.log(f"  > SAVED: {host}.{ext}")
-                        else: self.log(f"  > FAIL: {res}")
-                    else:
-                        cfg = NetworkRunner.render_config(p['template'], row_data)
-                        ok, res = NetworkRunner.push_ssh(dev, cfg)
-                        self.log(f"  > {'SUCCESS' if ok else 'FAIL'}: {res}")
-                
-                elif p['protocol'] == "NETCONF":
-                    dev = {'host': c_host, 'username': p['user'], 'password': p['pass'], 'port': c_port, 'device_params': {'name':'default'}}
-                    if p['mode'] == 'retrieve':
-                        # Handle Filter (JSON -> XML or Raw XML)
-                        filter_content = ""
-                        try:
-                            if p['netconf_file'].endswith('.json'):
-                                with open(p['netconf_file'], 'r') as f:
-                                    json_data = json.load(f)
-                                filter_content = NetworkRunner.json_to_xml(json_data)
-                            else:
-                                with open(p['netconf_file'], 'r') as f: filter_content = f.read()
-                        except Exception as e: self.log(f"  > FILTER ERR: {e}"); continue
-
-                        ok, res = NetworkRunner.retrieve_netconf(dev, filter_content)
-                        if ok:
-                            if not os.path.exists("results"): os.makedirs("results")
-                            with open(f"results/{host}.xml", "w") as f: f.write(res)
-                            self.log(f"  > SAVED: {host}.xml")
-                        else: self.log(f"  > FAIL: {res}")
-                    else:
-                        cfg = NetworkRunner.render_config(p['template'], row_data)
-                        ok, res = NetworkRunner.push_netconf(dev, cfg)
-                        self.log(f"  > {'SUCCESS' if ok else 'FAIL'}: {res}")
-
-            # 3. Report
-            if p['mode'] == 'retrieve' and p['auto_convert'] and p['protocol'] == 'SSH':
-                self.log("Generating Report...")
-                ok, msg = ReportGenerator.generate_excel_report(p['format'], p['regex_file'])
-                self.log(f"REPORT: {msg}")
-
-        except Exception as e: self.log(f"CRITICAL: {e}")
+            # 1. Run plan + pre-render (before any connection is opened)
+            try: plan, inventory = RunPlan(p), InventoryReader(p['excel'])
+            except ValueError as e:
+                log(f"PLAN ERROR: {e}"); result['status'] = 'plan_error'; return result
+            plan.runlog, plan.failed, plan.cancel = runlog, result['failed'], self._cancel
+            if p.get('resume'):
+                try: inventory = self._resume(plan, inventory, log)
+                except ValueError as e:
+                    log(f"PLAN ERROR: {e}"); result['status'] = 'plan_error'; return result
+            devices = None
+            if p.get('prerender') or p.get('dry_run'):
+                rows = list(inventory)
+                devices = [plan.resolve(row) for row in rows]
+                if plan.mode == 'push' and p.get('prerender'):
+                    plan.rendered = self._prerender(p, rows, log)
+                    if plan.rendered is None: result['status'] = 'plan_error'; return result
+            for line in plan.summary(devices): log(line)
+            if p.get('dry_run'):
+                log("Dry run: nothing was sent to devices."); result['status'] = 'dry_run'; return result
+            if not plan.journal: plan.journal = RunJournal.create(p, run_id=runlog.run_id)
+            plan.run_id = result['run_id'] = plan.journal.run_id
+            log(f"Run ID: {plan.run_id}")
+
+            # 2. Jump Hosts. The default one is connected up front; per-row bastions on first use.
+            tunnel = TunnelPool(p['jh_user'], p['jh_pass'], p.get('tunnel_buffer') or DEFAULT_TUNNEL_BUFFER, plan.jump_transports,
+                                plan.jump_limit, plan.jump_groups, p.get('jh_port') or 22)
+            if plan.default_jump:
+                log(f"Connecting to Jump Host {plan.default_jump}...")
+                t0 = time.monotonic()
+                ok, msg = tunnel.connect(plan.default_jump)
+                self._phase(plan, None, "jump_connect", t0, ok, msg)
+                if not ok:
+                    log(f"Jump Error: {msg}")
+                    result['status'] = 'jump_error'; return result
+                log(f"{msg}.")
+
+            if plan.mode == 'retrieve':
+                plan.store = ResultsStore()
+                plan.store.start_run(p, plan.run_id)
+            plan.watchdog = Watchdog(self._cancel, plan.device_timeout)
+
+            # 3. Process Devices (worker pool). Rows are dispatched while the inventory is still
+            # being read; the backlog semaphore keeps read-ahead bounded.
+            backlog = threading.BoundedSemaphore(plan.workers * 2)
+            count = 0
+            with ThreadPoolExecutor(max_workers=plan.workers, thread_name_prefix="collexa") as pool:
+                for device in devices if devices is not None else (plan.resolve(row) for row in inventory):
+                    backlog.acquire()
+                    if self._cancel.is_set(): break
+                    pool.submit(self._run_device, plan, device, tunnel).add_done_callback(lambda _: backlog.release())
+                    count += 1
+            result['devices'] = count = count - len(plan.skipped)
+            log(f"Processed {count} devices" + (f", {len(plan.failed)} failed." if plan.failed else "."))
+            if plan.watchdog.expired: log(f"Deadline: {plan.watchdog.expired} device(s) stopped after {plan.device_timeout}s")
+            if plan.mode == 'push':
+                result['changes'] = {'changed': plan.outcomes.count('changed'), 'unchanged': plan.outcomes.count('unchanged'),
+                                     'failed': len(plan.failed)}
+                log("PUSH RESULT: " + ", ".join(f"{n} {k}" for k, n in result['changes'].items()))
+            if self._cancel.is_set():
+                log(f"CANCELLED: devices not yet started were skipped; --resume {plan.run_id} continues the run")
+                result['status'] = 'cancelled'; return result
+            if plan.store and plan.export_files:
+                t0 = time.monotonic()
+                log(f"Exported {plan.store.export(plan.run_id, plan.results_dir, p['format'] if plan.protocol == 'SSH' else None)} result files to {plan.results_dir}/")
+                self._phase(plan, None, "export", t0, True)
+
+            # 4. Report
+            if p['mode'] == 'retrieve' and p['auto_convert']:
+                log("Generating Report...")
+                fmt, t0 = p['format'] if plan.protocol == 'SSH' else 'XML', time.monotonic()
+                ok, msg = ReportGenerator.generate_excel_report(fmt, p.get('regex_file'), p.get('report_format') or 'xlsx', run_id=plan.run_id,
+                                                                xpath_spec_path=p.get('xpath_file'))
+                result['report'] = (ok, msg)
+                self._phase(plan, None, "report", t0, ok, msg)
+                log(f"REPORT: {msg}")
+            result['status'] = 'ok'
+
+        except Exception as e: log(f"CRITICAL: {e}")
+        finally:
+            if plan and plan.watchdog: plan.watchdog.close()
+            if plan: plan.timing.save()
+            if plan and plan.pushed: plan.pushed.save()
+            if plan and plan.platforms: plan.platforms.save()
+            if plan and plan.store: plan.store.close()
+            if plan and plan.journal:
+                plan.journal.close()
+                log(f"Journal: {plan.journal.path}" + (f" (--retry-failed {plan.run_id} reruns the failed devices)" if result['failed'] else ""))
+            if tunnel:
+                stats = tunnel.stats()
+                if stats:
+                    up, down = sum(s['bytes_up'] for s in stats), sum(s['bytes_down'] for s in stats)
+                    runlog.count('tunnel_up', up); runlog.count('tunnel_down', down)
+                    log(f"Jump Host Traffic: {len(stats)} tunnels over {tunnel.describe() or 'no open transports'}, {up} B up / {down} B down"
+                        + (f", {tunnel.reconnects} transports replaced" if tunnel.reconnects else ""))
+                tunnel.close()
+            if result['devices']:
+                summary, lines = runlog.summary(result['devices'], len(result['failed']))
+                result['metrics'] = summary
+                for line in lines: log(line)
+            log(f"Run log: {runlog.path}")
+            log("--- DONE ---")
+            runlog.close()
+        return result
+
+    @staticmethod
+    def _resume(plan, inventory, log):
+        """Reopens a run's journal and returns the inventory rows it still has to process: every
+        device not yet finished, or with resume_mode 'retry' only the failed ones."""
+        p = plan.params
+        journal = RunJournal.reopen(p['resume'])
+        changed = journal.changed_inputs(p)
+        if changed and not p.get('resume_force'):
+            journal.close()
+            raise ValueError(f"Inputs changed since run {journal.run_id} started ({', '.join(changed)}); start a new run instead")
+        plan.journal, plan.resumed = journal, True
+        retry = p.get('resume_mode') == 'retry'
+        journal.mark_resumed(p.get('resume_mode') or 'resume')
+        counts = journal.counts()
+        log(f"{'Retrying failed devices of' if retry else 'Resuming'} run {journal.run_id}: {counts.get('ok', 0)} done, "
+            f"{counts.get('fail', 0)} failed, {counts.get('run', 0)} interrupted")
+        host = lambda row: str(row.get('ip') or row.get('host'))
+        return (row for row in inventory if journal.pending(host(row), retry))
+
+    def _prerender(self, p, rows, log):
+        """Renders every device config up front with strict undefined checks and writes them
+        to RENDER_DIR. Returns {host: config}, or None if any device failed to render."""
+        log("Pre-rendering configs...")
+        rendered, errors = NetworkRunner.prerender(p['template'], rows, RENDER_DIR)
+        for host, err in errors: log(f"[{host}] RENDER ERR: {err}")
+        if errors:
+            log(f"Pre-render failed for {len(errors)} device(s). Nothing was pushed.")
+            return None
+        log(f"Pre-rendered {len(rendered)} configs to {RENDER_DIR}/")
+        return rendered
+
+    def _run_device(self, plan, device, tunnels):
+        """Worker entry point: runs one device, holding a slot on its jump host when tunnelled."""
+        host, t0, ok, queued_out = device['host'], time.monotonic(), False, False
+        tunnel = tunnels if device['jump'] else None
+        log = lambda msg: self.log(msg, plan.runlog, host)
+        if plan.cancel and plan.cancel.is_set():
+            plan.skipped.append(host); return  # left unjournaled, so a resume picks it up
+        if plan.journal: plan.journal.start(host)
+        try:
+            if plan.resumed and plan.store: plan.store.discard(plan.run_id, host)
+            if plan.mode == 'retrieve' and plan.protocol == "SSH" and not device['commands']:
+                plan.errors[host] = "No command to run"
+                log("  > FAIL: No command to run"); return
+            if tunnel:
+                with tunnel.slot(device['jump'], plan.cancel): ok = self._guarded(plan, device, tunnel, log)
+            else: ok = self._guarded(plan, device, tunnel, log)
+        except DeviceAborted:  # cancelled while queued for a jump slot: skipped, still pending in the journal
+            queued_out = True; plan.skipped.append(host)
+        except Exception as e:
+            plan.errors[host] = f"{type(e).__name__}: {e}"
+            log(f"ERROR: {e}")
         finally:
-            if tunnel: tunnel.close()
-            self.log("--- DONE ---")
\ No newline at end of file
+            if not queued_out:
+                self._phase(plan, host, "device", t0, ok)
+                if plan.journal: plan.journal.done(host, ok, plan.errors.get(host))
+                if not ok: plan.failed.append(host)
+
+    def _guarded(self, plan, device, tunnel, log):
+        """Runs a device under its wall-clock deadline; a tripped deadline fails it with the reason.
+        A failure that looks like the wrong driver on an autodetected host re-probes it and retries."""
+        deadline = plan.watchdog.start(device['host'])
+        try:
+            ok = self._process_device(plan, device, tunnel, log, deadline)
+            if not ok and device['platform'] == 'cache' and driver_mismatch(plan.errors.get(device['host'])):
+                # the cached driver may be stale (OS upgrade, replaced box): probe again and retry once
+                log(f"  > PLATFORM: cached driver {device['device_type']} looks wrong, probing again")
+                plan.platforms.forget(device['host'])
+                ok = self._process_device(plan, dict(device, platform='probe', reprobe=device['device_type']), tunnel, log, deadline)
+        except DeviceAborted: ok = False
+        finally: plan.watchdog.finish(deadline)
+        if deadline.reason and not ok:
+            plan.errors[device['host']] = deadline.reason
+            log(f"  > ABORTED: {deadline.reason}")
+        return ok
+
+    def _tunnel(self, plan, device, dev, tunnel, deadline, log):
+        """Points the connection params `dev` at the device through its jump host and returns the
+        jump channel, or None when a loopback forward is used."""
+        host, t0, sock = device['host'], time.monotonic(), None
+        try:
+            if plan.params.get('tunnel_mode', 'direct') == 'direct' and self._accepts_sock(plan, device['device_type']):
+                log(f"Opening jump channel via {device['jump']}...")
+                sock = dev['sock'] = tunnel.open_channel(device['jump'], host, device['port'], deadline)
+                deadline.watch(sock.close)
+            else:
+                log(f"Tunneling via {device['jump']}...")
+                dev['port'] = tunnel.start_forwarding(device['jump'], host, device['port'], deadline)
+                dev['host'] = "127.0.0.1"
+                deadline.watch(lambda: tunnel.release(dev['port']))
+        except Exception as e:
+            self._phase(plan, host, "tunnel", t0, False, e); raise
+        self._phase(plan, host, "tunnel", t0, True)
+        return sock
+
+    def _reopener(self, plan, device, tunnel, deadline, log, extra):
+        """reopen() for a second connection to the device within one push (SCP upload, confirmed-commit
+        check): fresh connection params, through a jump channel or forward of its own when tunnelled,
+        since the session's own cannot carry another login. Opened params are collected in `extra`."""
+        def reopen():
+            again = dict(device['conn'])
+            if tunnel: self._tunnel(plan, device, again, tunnel, deadline, log); extra.append(again)
+            return again
+        return reopen
+
+    @staticmethod
+    def _release_reopened(tunnel, extra):
+        for again in extra:
+            if 'sock' in again: again['sock'].close()
+            else: tunnel.release(again['port'])
+
+    def _probe(self, plan, device, dev, tunnel, deadline, log):
+        """Detects an unknown host's netmiko driver over its own short session and caches it, then
+        switches `device` and its connection params `dev` to that driver and its timings."""
+        host, probe, t0 = device['host'], dict(dev), time.monotonic()
+        if tunnel:
+            try: sock = self._tunnel(plan, device, probe, tunnel, deadline, log)
+            except Exception as e:
+                log(f"Tunnel Error: {e}"); return False
+        log("Detecting platform...")
+        ok, found = NetworkRunner.detect_ssh(probe, deadline)
+        if tunnel and not sock: tunnel.release(probe['port'])
+        self._phase(plan, host, "detect", t0, ok, found)
+        if not ok:
+            log(f"  > FAIL: platform probe: {found}"); return False
+        if not found:
+            log(f"  > PLATFORM: not detected, using {device['device_type']}"); return True
+        plan.platforms.record(host, 'ssh', device_type=found)
+        if found == device.get('reprobe'):
+            log(f"  > PLATFORM: probe confirms {found}, so the failure is not a driver mismatch"); return False
+        log(f"  > PLATFORM: {found} (detected, cached)")
+        if found != device['device_type']:
+            timing, settings = plan.timing.for_device(found, host)
+            device.update(device_type=found, timing=timing, read_timeout=settings.pop('read_timeout'))
+            dev.update(settings, device_type=found)
+        return True
+
+    @staticmethod
+    def _accepts_sock(plan, dtype):
+        """NETCONF and netmiko SSH drivers take the jump channel as `sock`; telnet/serial need a listener."""
+        return plan.protocol == "NETCONF" or not str(dtype).endswith(LISTENER_ONLY_SUFFIXES)
+
+    @staticmethod
+    def _learn_platform(plan, host, timings):
+        """Caches the NETCONF hints (handler, capability flags, netmiko driver) from a session's hello."""
+        if plan.platforms and timings.get('platform'): plan.platforms.record(host, 'netconf', **timings['platform'])
+
+    @staticmethod
+    def _save(plan, host, outputs, log):
+        """Appends a device's outputs ([(command, text), ...]) to the run's results store."""
+        plan.store.add(plan.run_id, host, outputs, plan.ext)
+        log(f"  > SAVED: {host} ({len(outputs)} output{'s' if len(outputs) > 1 else ''})")
+
+    def _render(self, plan, device):
+        t0 = time.monotonic()
+        cfg = NetworkRunner.render_config(plan.params['template'], device['row'])
+        self._phase(plan, device['host'], "render", t0, True)
+        return cfg
+
+    @staticmethod
+    def _push_outcome(plan, host, ok, res, digest, lines, log, timings=None):
+        """Logs a push as CHANGED / UNCHANGED / FAIL and keeps the pushed-config cache current."""
+        timings = timings or {}
+        if timings.get('fallback'): log(f"  > LINE BY LINE: {timings['fallback']}")
+        if timings.get('method') == "bulk": res = f"bulk transfer, {res}"
+        if not ok:
+            if plan.pushed: plan.pushed.forget(host)
+            log(f"  > FAIL: {res}"); return
+        if plan.pushed: plan.pushed.record(host, digest)
+        if lines == 0:
+            plan.outcomes.append('unchanged')
+            if timings.get('rendered'): log("  > UNCHANGED: running config already has every line")
+            else: log("  > UNCHANGED: nothing to push, the rendered config is empty")
+            return
+        plan.outcomes.append('changed')
+        if not plan.pushed: log(f"  > SUCCESS: {res}")
+        else: log("  > CHANGED" + (f" ({lines} line{'s' if lines != 1 else ''})" if lines else "") + f": {res}")
+
+    def _process_device(self, plan, device, tunnel, log, deadline):
+        """Runs one device and returns True on success. Each phase (tunnel, render, connect, prompt,
+        execute, retrieve/push session, save) is recorded in the run log as a timed span. The jump
+        channel or forward and the driver session are registered with `deadline` so they can be
+        aborted; a listener forward is released when the device is done."""
+        host, dev, sock = device['host'], dict(device['conn']), None
+        cfg, digest = None, None
+        deadline.check()
+        if plan.mode == 'push':
+            cfg = plan.rendered[host] if plan.rendered else self._render(plan, device)
+            if plan.pushed:
+                digest = config_digest(plan.protocol, cfg)
+                if (plan.push_diff == 'cache' or plan.protocol == "NETCONF") and plan.pushed.matches(host, digest):
+                    plan.outcomes.append('unchanged')
+                    log("  > UNCHANGED: same config as the last successful push"); return True
+
+        if device['platform'] == 'probe' and not self._probe(plan, device, dev, tunnel, deadline, log): return False
+
+        # Tunnel Setup
+        if tunnel:
+            try: sock = self._tunnel(plan, device, dev, tunnel, deadline, log)
+            except Exception as e:
+                log(f"Tunnel Error: {e}"); return False
+
+        # Execution
+        deadline.check()
+        log("Processing...")
+        t0 = time.monotonic()
+
+        if plan.protocol == "SSH":
+            if plan.mode == 'retrieve':
+                cmds, timings = device['commands'], {}
+                ok, res = NetworkRunner.retrieve_ssh_stream(dev, cmds, plan.spool_dir, device['read_timeout'], timings, deadline)
+                plan.timing.learn(host, device['device_type'], timings, ok)
+                self._session_spans(plan, host, t0, timings)
+                self._phase(plan, host, "retrieve", t0, ok, res)
+                if ok:
+                    t0 = time.monotonic()
+                    try:
+                        size = sum(os.path.getsize(p) for _, p in res)
+                        plan.store.add_files(plan.run_id, host, res, plan.ext)
+                        if plan.runlog: plan.runlog.count('output', size)
+                        log(f"  > SAVED: {host} ({len(res)} output{'s' if len(res) > 1 else ''}, {size} B)")
+                    finally:
+                        for _, path in res: os.remove(path)
+                    self._phase(plan, host, "save", t0, True)
+                else: log(f"  > FAIL: {res}")
+            else:
+                timings, t0, extra = {}, time.monotonic(), []
+                try: ok, res = NetworkRunner.push_ssh(dev, cfg, device['read_timeout'], timings, diff=plan.push_diff == 'running',
+                                                      method=plan.push_method, guard=deadline,
+                                                      reopen=self._reopener(plan, device, tunnel, deadline, log, extra))
+                finally: self._release_reopened(tunnel, extra)
+                plan.timing.learn(host, device['device_type'], timings, ok)
+                self._session_spans(plan, host, t0, timings)
+                self._phase(plan, host, "push", t0, ok, res)
+                self._push_outcome(plan, host, ok, res, digest, timings.get('lines'), log, timings)
+
+        elif plan.protocol == "NETCONF":
+            if plan.mode == 'retrieve':
+                timings = {}
+                ok, res = NetworkRunner.retrieve_netconf(dev, plan.netconf_ops, timings, deadline)
+                self._learn_platform(plan, host, timings)
+                self._session_spans(plan, host, t0, timings)
+                self._phase(plan, host, "retrieve", t0, ok, res)
+                if ok:
+                    t0 = time.monotonic()
+                    self._save(plan, host, res, log)
+                    if plan.runlog: plan.runlog.count('output', sum(len(x.encode('utf-8')) for _, x in res))
+                    self._phase(plan, host, "save", t0, True)
+                else: log(f"  > FAIL: {res}")
+            else:
+                timings, t0, extra = {}, time.monotonic(), []
+                reopen = self._reopener(plan, device, tunnel, deadline, log, extra)  # for the confirmed-commit check
+                try: ok, res = NetworkRunner.push_netconf(dev, cfg, timings, plan.netconf_target, plan.confirm_timeout, deadline, reopen)
+                finally: self._release_reopened(tunnel, extra)
+                self._learn_platform(plan, host, timings)
+                self._session_spans(plan, host, t0, timings)
+                self._phase(plan, host, "push", t0, ok, res)
+                self._push_outcome(plan, host, ok, res, digest, None, log)
+
+        if tunnel:
+            st = sock.stats.as_dict() if sock else tunnel.stats(dev['port'])
+            if st: log(f"  > TUNNEL: {st['bytes_up']} B up / {st['bytes_down']} B down, {st['kbps']} KB/s")
+            if not sock: tunnel.release(dev['port'])
+        return ok
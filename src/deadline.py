@@ -0,0 +1,74 @@
+import time
+import threading
+
+DEFAULT_DEVICE_TIMEOUT = 600
+CANCELLED = "run cancelled"
+
+class DeviceAborted(Exception):
+    """A device was stopped because its deadline passed or the run was cancelled."""
+
+class Deadline:
+    """Wall-clock budget of one device, covering tunnel, connect and execute. Whatever the device
+    can block on (jump channel, forward listener, driver session) is registered with watch();
+    when the budget runs out or the run is cancelled those are closed, so the blocked call fails
+    right away instead of waiting for its own read timeout."""
+    def __init__(self, host, seconds=0):
+        self.host, self.seconds = host, seconds
+        self.expires = time.monotonic() + seconds if seconds else None
+        self.reason = None
+        self._closers, self._lock = [], threading.Lock()
+
+    def watch(self, closer):
+        with self._lock:
+            if self.reason is None: self._closers.append(closer); return
+        self._call(closer)  # already tripped
+
+    def check(self):
+        if self.reason: raise DeviceAborted(self.reason)
+
+    def trip(self, reason):
+        with self._lock:
+            if self.reason: return
+            self.reason, closers, self._closers = reason, self._closers, []
+        for closer in reversed(closers): self._call(closer)
+
+    @staticmethod
+    def _call(closer):
+        try: closer()
+        except Exception: pass
+
+class Watchdog:
+    """One thread per run that trips device deadlines once they expire, or all of them when the
+    `cancel` event is set."""
+    TICK = 0.25
+
+    def __init__(self, cancel, seconds=DEFAULT_DEVICE_TIMEOUT):
+        self.cancel, self.seconds = cancel, seconds
+        self.expired = 0
+        self._active, self._lock = set(), threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="collexa-watchdog", daemon=True)
+        self._thread.start()
+
+    def start(self, host):
+        deadline = Deadline(host, self.seconds)
+        with self._lock: self._active.add(deadline)
+        if self.cancel.is_set(): deadline.trip(CANCELLED)
+        return deadline
+
+    def finish(self, deadline):
+        with self._lock: self._active.discard(deadline)
+
+    def _loop(self):
+        while not self._stop.wait(self.TICK):
+            now, cancelled = time.monotonic(), self.cancel.is_set()
+            with self._lock: active = list(self._active)
+            for d in active:
+                if cancelled: d.trip(CANCELLED)
+                elif d.expires and now > d.expires and not d.reason:
+                    self.expired += 1
+                    d.trip(f"deadline of {d.seconds}s exceeded")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,64 @@
+import csv
+import os
+
+class InventoryReader:
+    """Streams device rows from an .xlsx, .csv or .yaml inventory without loading it all first.
+    Headers are normalized ('Device Type' -> 'device_type') and empty cells are dropped."""
+    EXTENSIONS = ('.xlsx', '.xlsm', '.csv', '.yaml', '.yml')
+
+    def __init__(self, path):
+        self.path = path
+        self.ext = os.path.splitext(str(path))[1].lower()
+        if self.ext not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported inventory type '{self.ext}' (use {', '.join(self.EXTENSIONS)})")
+
+    @staticmethod
+    def normalize_header(name):
+        return str(name).strip().replace(" ", "_").lower()
+
+    @staticmethod
+    def compact(row):
+        """Drops empty cells and strips strings so each record only carries real values."""
+        out = {}
+        for k, v in row.items():
+            if v is None or k is None: continue
+            if isinstance(v, str):
+                v = v.strip()
+                if not v: continue
+            out[k] = v
+        return out
+
+    def __iter__(self):
+        rows = self._xlsx() if self.ext in ('.xlsx', '.xlsm') else self._csv() if self.ext == '.csv' else self._yaml()
+        for row in rows:
+            row = self.compact(row)
+            if row.get('ip') or row.get('host'): yield row
+
+    def _xlsx(self):
+        from openpyxl import load_workbook
+        wb = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header: return
+            keys = [self.normalize_header(h) if h is not None else None for h in header]
+            for values in rows:
+                yield dict(zip(keys, values))
+        finally: wb.close()
+
+    def _csv(self):
+        with open(self.path, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if not header: return
+            keys = [self.normalize_header(h) for h in header]
+            for values in reader:
+                yield dict(zip(keys, values))
+
+    def _yaml(self):
+        try: import yaml
+        except ImportError: raise RuntimeError("YAML inventories need PyYAML (pip install pyyaml)")
+        with open(self.path, 'r') as f: data = yaml.safe_load(f) or []
+        if isinstance(data, dict): data = data.get('devices', [])
+        for item in data:
+            if isinstance(item, dict): yield {self.normalize_header(k): v for k, v in item.items()}
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import uuid
+import queue
+import hashlib
+import threading
+
+JOURNAL_DIR = os.path.join("results", "journal")
+SECRET_KEYS = ('pass', 'jh_pass')
+INPUT_KEYS = ('excel', 'template', 'cmd', 'netconf_file')
+RUNNING, DONE, FAILED = "run", "ok", "fail"
+
+def new_run_id():
+    return time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+    return h.hexdigest()[:16]
+
+def input_hashes(params):
+    """Short content hashes of the files a run acts on (inventory, template, command file, filters).
+    Inline values such as ';'-separated commands are hashed as text."""
+    hashes = {}
+    for key in INPUT_KEYS:
+        value = str(params.get(key) or "").strip()
+        if not value: continue
+        items = [v.strip() for v in value.split(";") if v.strip()] if key == 'netconf_file' else [value]
+        paths = [v.split(":", 1)[1].strip() if v.startswith(("get:", "get-config:")) else v for v in items]
+        if all(os.path.isfile(v) for v in paths): hashes[key] = "+".join(file_hash(v) for v in paths)
+        else: hashes[key] = hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]
+    return hashes
+
+def error_class(detail):
+    """Coarse failure class kept in the journal: cancelled, deadline, auth, timeout, refused, unreachable,
+    tunnel, render or error."""
+    text = str(detail or "").lower()
+    for cls, words in (('cancelled', ("run cancelled",)), ('deadline', ("deadline of",)),
+                       ('auth', ("auth", "permission denied", "password")), ('timeout', ("timed out", "timeout")),
+                       ('refused', ("refused",)),
+                       ('unreachable', ("unreachable", "no route", "name or service", "tcp connection to device failed")),
+                       ('tunnel', ("jump host", "channel", "tunnel")), ('render', ("undefined", "template"))):
+        if any(w in text for w in words): return cls
+    return "error"
+
+class RunJournal:
+    """Durable per-device progress of one run (results/journal/<run_id>.jsonl). The first line holds
+    the run's params (without passwords) and input hashes; every further line is a compact
+    [host, state(, error class)] record, last one wins. Records are queued and appended by a
+    background thread that flushes and fsyncs each batch, so workers never wait on the disk."""
+    def __init__(self, path, header, states=None):
+        self.path, self.header, self.run_id = path, header, header['run_id']
+        self.states = states or {}
+        self._q = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name="collexa-journal", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def path_for(run_id, journal_dir=JOURNAL_DIR):
+        return os.path.join(journal_dir, f"{run_id}.jsonl")
+
+    @classmethod
+    def create(cls, params, run_id=None, journal_dir=JOURNAL_DIR):
+        os.makedirs(journal_dir, exist_ok=True)
+        run_id = run_id or new_run_id()
+        safe = {k: v for k, v in params.items() if k not in SECRET_KEYS and k not in ('resume', 'resume_mode')}
+        header = {'run_id': run_id, 'started': round(time.time(), 3), 'mode': params.get('mode'),
+                  'protocol': params.get('protocol'), 'params': safe, 'inputs': input_hashes(params)}
+        path = cls.path_for(run_id, journal_dir)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header) + "\n"); f.flush(); os.fsync(f.fileno())
+        return cls(path, header)
+
+    @staticmethod
+    def latest(journal_dir=JOURNAL_DIR):
+        try: names = [n for n in os.listdir(journal_dir) if n.endswith(".jsonl")]
+        except OSError: names = []
+        if not names: raise ValueError("No run journal found")
+        return max(names, key=lambda n: os.path.getmtime(os.path.join(journal_dir, n)))[:-len(".jsonl")]
+
+    @classmethod
+    def load(cls, run_id="last", journal_dir=JOURNAL_DIR):
+        """(header, {host: (state, error_class)}) of a journaled run; 'last' is the newest one."""
+        if run_id in (None, "", "last"): run_id = cls.latest(journal_dir)
+        path = cls.path_for(run_id, journal_dir)
+        if not os.path.isfile(path): raise ValueError(f"No journal for run {run_id}")
+        states = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            for line in f:
+                try: rec = json.loads(line)
+                except ValueError: continue  # torn last line after a crash
+                if isinstance(rec, list): states[rec[0]] = (rec[1], rec[2] if len(rec) > 2 else None)
+        return header, states
+
+    @classmethod
+    def resume_params(cls, run_id="last", retry=False, journal_dir=JOURNAL_DIR):
+        """Params to resume a journaled run; passwords are not journaled and must be added."""
+        header, _ = cls.load(run_id, journal_dir)
+        return dict(header['params'], resume=header['run_id'], resume_mode="retry" if retry else "resume")
+
+    @classmethod
+    def reopen(cls, run_id, journal_dir=JOURNAL_DIR):
+        header, states = cls.load(run_id, journal_dir)
+        with open(cls.path_for(header['run_id'], journal_dir), 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n": f.write(b"\n")  # terminate a torn record
+        return cls(cls.path_for(header['run_id'], journal_dir), header, states)
+
+    def mark_resumed(self, mode):
+        self._q.put({'resumed': round(time.time(), 3), 'mode': mode})
+
+    def changed_inputs(self, params):
+        """Input files whose content differs from when the run started."""
+        now = input_hashes(params)
+        return [k for k, v in self.header.get('inputs', {}).items() if now.get(k) != v]
+
+    def pending(self, host, retry_failed=False):
+        """Whether a resumed run still has to process `host`: anything not finished, or with
+        `retry_failed` only the hosts that failed."""
+        state = self.states.get(host, (None,))[0]
+        return state == FAILED if retry_failed else state != DONE
+
+    def counts(self):
+        out = {}
+        for state, _ in self.states.values(): out[state] = out.get(state, 0) + 1
+        return out
+
+    def start(self, host):
+        self._q.put([host, RUNNING])
+
+    def done(self, host, ok, error=None):
+        self._q.put([host, DONE] if ok else [host, FAILED, error_class(error)])
+
+    def _writer(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                batch = [self._q.get()]
+                try:
+                    while len(batch) < 1000: batch.append(self._q.get_nowait())
+                except queue.Empty: pass
+                f.writelines(json.dumps(r, separators=(',', ':')) + "\n" for r in batch if r is not None)
+                f.flush(); os.fsync(f.fileno())
+                if None in batch: return
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
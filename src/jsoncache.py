@@ -0,0 +1,23 @@
+import os
+import json
+import threading
+
+class JsonCache:
+    """Per-host records in one JSON file under .collexa_cache. The file is read once (a missing or
+    unreadable one starts empty), subclasses change `hosts` under `_lock` and set `_dirty`, and
+    save() writes it back atomically only when something changed."""
+    def __init__(self, path):
+        self.path = path
+        self._lock, self._dirty = threading.Lock(), False
+        try:
+            with open(path, 'r') as f: self.hosts = json.load(f)
+        except: self.hosts = {}
+
+    def save(self):
+        if not self._dirty: return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self._lock:
+            with open(tmp, 'w') as f: json.dump(self.hosts, f)
+            self._dirty = False
+        os.replace(tmp, self.path)
@@ -1,29 +1,38 @@
-import pandas as pd
-from jinja2 import Template
-from netmiko import ConnectHandler
-from ncclient import manager
-from cryptography.fernet import Fernet
 import os
 import json
+import contextlib
+import hashlib
 import socket
-import select
+import selectors
+import time
 import threading
-import paramiko
-import glob
+import mmap
 import re
+import tempfile
+import xml.sax
 import xml.etree.ElementTree as ET
-import xml.dom.minidom
+from .configdiff import config_delta, running_config_command
+from .bulkpush import bulk_push, use_bulk, TransferError
+from .platforms import netconf_hint
+from .deadline import DeviceAborted, CANCELLED
 
 class CredentialManager:
     def __init__(self, key_file='secret.key', cred_file='creds.dat'):
         self.key_file = key_file
         self.cred_file = cred_file
-        self._init_key()
+        self._cipher = None
+
+    @property
+    def cipher(self):
+        """Fernet cipher, built on first load/save so the cryptography import stays off startup."""
+        if self._cipher is None: self._init_key()
+        return self._cipher
 
     def _init_key(self):
+        from cryptography.fernet import Fernet
         if not os.path.exists(self.key_file):
             with open(self.key_file, 'wb') as kf: kf.write(Fernet.generate_key())
-        with open(self.key_file, 'rb') as kf: self.cipher = Fernet(kf.read())
+        with open(self.key_file, 'rb') as kf: self._cipher = Fernet(kf.read())
 
     def save_credentials(self, section, username, password):
         try:
@@ -50,14 +59,75 @@ class CredentialManager:
             return data.get(section, {}).get('username'), data.get(section, {}).get('password')
         except: return None, None
 
+class TunnelStats:
+    """Byte and throughput counters for one forwarded device session."""
+    def __init__(self, target):
+        self.target = target
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.opened_at = time.monotonic()
+        self.closed_at = None
+
+    @property
+    def duration(self):
+        return (self.closed_at or time.monotonic()) - self.opened_at
+
+    def as_dict(self):
+        d = self.duration
+        return {'target': self.target, 'bytes_up': self.bytes_up, 'bytes_down': self.bytes_down,
+                'seconds': round(d, 3), 'kbps': round((self.bytes_up + self.bytes_down) / 1024 / d, 1) if d else 0.0}
+
+class TunnelChannel:
+    """Socket-like wrapper around a direct-tcpip channel, handed straight to netmiko/ncclient."""
+    def __init__(self, channel, stats):
+        self._channel, self.stats = channel, stats
+
+    def send(self, data):
+        n = self._channel.send(data); self.stats.bytes_up += n
+        return n
+
+    def sendall(self, data):
+        self._channel.sendall(data); self.stats.bytes_up += len(data)
+
+    def recv(self, nbytes):
+        data = self._channel.recv(nbytes); self.stats.bytes_down += len(data)
+        return data
+
+    def close(self):
+        if not self.stats.closed_at: self.stats.closed_at = time.monotonic()
+        self._channel.close()
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+class _ForwardPipe:
+    """One local socket <-> paramiko channel pair with bounded buffers in each direction."""
+    def __init__(self, listener, channel, stats):
+        self.listener, self.channel, self.client, self.stats = listener, channel, None, stats
+        self.to_remote, self.to_local = bytearray(), bytearray()
+        self.client_eof = self.remote_eof = False
+        self.remote_shut = self.local_shut = False
+
 class TunnelManager:
-    def __init__(self, host, port, user, password):
+    ACCEPT_TIMEOUT = 60  # a forward whose driver never connects is closed after this many seconds
+
+    def __init__(self, host, port, user, password, buffer_size=65536):
         self.host, self.port, self.user, self.password = host, int(port), user, password
+        self.buffer_size = int(buffer_size)
         self.client = None
         self._local_binds = []
+        self._stats = {}
+        self._channels = []
+        self._pending, self._releasing = [], []
+        self._lock = threading.Lock()
+        self._selector = None
+        self._loop_thread = None
+        self._closed = False
+        self.reserved = 0
 
     def connect(self):
         try:
+            import paramiko
             self.client = paramiko.SSHClient()
             self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             self.client.connect(self.host, self.port, self.user, self.password, timeout=10)
@@ -65,41 +135,507 @@ class TunnelManager:
             return True, "Jump Host Connected"
         except Exception as e: return False, str(e)
 
+    def open_channel(self, target_host, target_port):
+        """Returns a socket-like direct-tcpip channel for drivers that accept a `sock` argument."""
+        channel = self.transport.open_channel("direct-tcpip", (target_host, int(target_port)), ('127.0.0.1', 0))
+        stats = TunnelStats(f"{target_host}:{target_port}")
+        self._stats[f"ch{channel.get_id()}"] = stats
+        with self._lock: self._channels.append(channel)
+        return TunnelChannel(channel, stats)
+
     def start_forwarding(self, target_host, target_port):
+        """Fallback for drivers without `sock` support: opens the channel behind a one-shot
+        loopback listener and returns the local port."""
+        channel = self.transport.open_channel("direct-tcpip", (target_host, int(target_port)), ('127.0.0.1', 0))
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.bind(('127.0.0.1', 0))
         local_port = sock.getsockname()[1]
         sock.listen(1)
-        threading.Thread(target=self._forwarder, args=(sock, target_host, target_port), daemon=True).start()
+        sock.setblocking(False)
+        self._stats[local_port] = TunnelStats(f"{target_host}:{target_port}")
+        with self._lock: self._channels.append(channel)
         self._local_binds.append(sock)
+        self._register(_ForwardPipe(sock, channel, self._stats[local_port]))
         return local_port
 
-    def _forwarder(self, local_sock, target_host, target_port):
-        try:
-            client, _ = local_sock.accept()
-            remote = self.transport.open_channel("direct-tcpip", (target_host, target_port), client.getpeername())
-            if remote is None: client.close(); return
-            while True:
-                r, _, _ = select.select([client, remote], [], [], 1.0)
-                if client in r:
-                    d = client.recv(1024); 
-                    if not d: break
-                    remote.send(d)
-                if remote in r:
-                    d = remote.recv(1024); 
-                    if not d: break
-                    client.send(d)
-            client.close(); remote.close()
+    def release(self, local_port):
+        """Closes a listener forward and its channel, whether or not the driver ever connected."""
+        st = self._stats.get(local_port)
+        if not st or st.closed_at or not self._loop_thread: return
+        with self._lock: self._releasing.append(st)
+        self._wake()
+
+    def alive(self):
+        return bool(self.client) and self.transport.is_active()
+
+    def active(self):
+        """Number of channels currently open (or being opened) on this transport."""
+        with self._lock:
+            self._channels = [ch for ch in self._channels if not ch.closed]
+            return len(self._channels) + self.reserved
+
+    def stats(self, local_port=None):
+        """Returns counters for one listener forward (by local port) or a list for every tunnel."""
+        if local_port is not None:
+            st = self._stats.get(local_port)
+            return st.as_dict() if st else None
+        return [st.as_dict() for st in self._stats.values()]
+
+    # --- Data plane: one selector thread multiplexes every forward ---
+    def _register(self, pipe):
+        with self._lock:
+            if self._closed: raise RuntimeError("Tunnel closed")
+            self._pending.append(pipe)
+            if self._loop_thread is None:
+                self._selector = selectors.DefaultSelector()
+                self._wake_r, self._wake_w = socket.socketpair()
+                self._wake_r.setblocking(False)
+                self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+                self._loop_thread = threading.Thread(target=self._loop, name="collexa-tunnel", daemon=True)
+                self._loop_thread.start()
+        self._wake()
+
+    def _wake(self):
+        try: self._wake_w.send(b"\0")
         except: pass
 
+    def _loop(self):
+        pipes = set()
+        while not self._closed:
+            with self._lock: new, self._pending, drop, self._releasing = self._pending, [], self._releasing, []
+            for pipe in new:
+                pipes.add(pipe)
+                self._selector.register(pipe.listener, selectors.EVENT_READ, pipe)
+            for pipe in pipes:
+                if any(pipe.stats is st for st in drop): self._finish(pipe)
+            # Channels cannot signal writability, so poll quickly while a channel send is backed up.
+            timeout = 0.02 if any(p.to_remote and p.client for p in pipes) else 1.0
+            for key, mask in self._selector.select(timeout):
+                pipe = key.data
+                if pipe is None:
+                    try: self._wake_r.recv(4096)
+                    except: pass
+                    continue
+                try:
+                    if key.fileobj is pipe.listener: self._accept(pipe)
+                    else:
+                        if mask & selectors.EVENT_READ: self._read(pipe, key.fileobj)
+                        if mask & selectors.EVENT_WRITE: self._flush_local(pipe)
+                except Exception: self._finish(pipe)
+            for pipe in list(pipes):
+                if pipe.stats.closed_at: pipes.discard(pipe); continue
+                try:
+                    if pipe.client: self._flush_remote(pipe); self._flush_local(pipe)
+                    elif pipe.stats.duration > self.ACCEPT_TIMEOUT: self._finish(pipe)
+                    if self._done(pipe): self._finish(pipe)
+                    else: self._update(pipe)
+                except Exception: self._finish(pipe)
+                if pipe.stats.closed_at: pipes.discard(pipe)
+        for pipe in pipes: self._finish(pipe)
+
+    def _accept(self, pipe):
+        client, _ = pipe.listener.accept()
+        client.setblocking(False)
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._selector.unregister(pipe.listener)
+        pipe.listener.close()
+        pipe.client = client
+        pipe.channel.setblocking(0)
+        self._selector.register(client, selectors.EVENT_READ, pipe)
+        self._selector.register(pipe.channel, selectors.EVENT_READ, pipe)
+
+    def _read(self, pipe, src):
+        if src is pipe.client:
+            try: data = pipe.client.recv(self.buffer_size)
+            except (BlockingIOError, InterruptedError): return
+            if not data: pipe.client_eof = True
+            else: pipe.to_remote += data
+        else:
+            try: data = pipe.channel.recv(self.buffer_size)
+            except socket.timeout: return
+            if not data: pipe.remote_eof = True
+            else: pipe.to_local += data
+
+    def _flush_remote(self, pipe):
+        while pipe.to_remote and pipe.channel.send_ready():
+            try: n = pipe.channel.send(bytes(pipe.to_remote[:self.buffer_size]))
+            except socket.timeout: break
+            if n <= 0: break
+            del pipe.to_remote[:n]; pipe.stats.bytes_up += n
+        if pipe.client_eof and not pipe.to_remote and not pipe.remote_shut:
+            pipe.channel.shutdown_write(); pipe.remote_shut = True
+
+    def _flush_local(self, pipe):
+        if pipe.to_local:
+            try: n = pipe.client.send(pipe.to_local)
+            except (BlockingIOError, InterruptedError): n = 0
+            del pipe.to_local[:n]; pipe.stats.bytes_down += n
+        if pipe.remote_eof and not pipe.to_local and not pipe.local_shut:
+            try: pipe.client.shutdown(socket.SHUT_WR)
+            except OSError: pass
+            pipe.local_shut = True
+
+    def _update(self, pipe):
+        if not pipe.client: return
+        ev = selectors.EVENT_WRITE if pipe.to_local else 0
+        if not pipe.client_eof and len(pipe.to_remote) < self.buffer_size: ev |= selectors.EVENT_READ
+        self._set_interest(pipe.client, ev, pipe)
+        want_remote = not pipe.remote_eof and len(pipe.to_local) < self.buffer_size
+        self._set_interest(pipe.channel, selectors.EVENT_READ if want_remote else 0, pipe)
+
+    def _set_interest(self, fileobj, events, pipe):
+        try: current = self._selector.get_key(fileobj).events
+        except KeyError: current = 0
+        if events == current: return
+        if not events: self._selector.unregister(fileobj)
+        elif not current: self._selector.register(fileobj, events, pipe)
+        else: self._selector.modify(fileobj, events, pipe)
+
+    def _done(self, pipe):
+        return pipe.local_shut and (pipe.remote_shut or pipe.channel.closed)
+
+    def _finish(self, pipe):
+        if pipe.stats.closed_at: return
+        pipe.stats.closed_at = time.monotonic()
+        for obj in (pipe.listener, pipe.client, pipe.channel):
+            if obj is None: continue
+            try: self._selector.unregister(obj)
+            except (KeyError, ValueError): pass
+            try: obj.close()
+            except: pass
+
     def close(self):
+        self._closed = True
+        if self._loop_thread:
+            self._wake()
+            self._loop_thread.join(timeout=5)
+            self._selector.close(); self._wake_r.close(); self._wake_w.close()
         for s in self._local_binds: s.close()
         if self.client: self.client.close()
 
+class TunnelPool:
+    """Every jump host of a run. A jump spec is a group name or "host[:port][,host[:port]...]".
+    Each bastion keeps up to `transports` SSH transports (one TunnelManager each): channels go to
+    the least busy live transport, another transport is opened while all of them are busy, and a
+    dropped transport is replaced on next use instead of failing every device behind it. Within a
+    group the least busy reachable bastion is used; an unreachable one is skipped for RETRY_AFTER s.
+    Each bastion admits at most `limit` devices at a time (see slot)."""
+    RETRY_AFTER = 30
+    WAIT_STEP = 0.2  # queued devices wake up this often to check their deadline or the run's cancel
+
+    def __init__(self, user, password, buffer_size=65536, transports=2, limit=5, groups=None, default_port=22):
+        self.user, self.password, self.buffer_size = user, password, buffer_size
+        self.transports, self.limit, self.default_port = max(1, int(transports)), max(1, int(limit)), int(default_port)
+        self.groups = {str(k): [self._key(b) for b in (v.split(",") if isinstance(v, str) else v) if str(b).strip()]
+                       for k, v in (groups or {}).items()}
+        self._lock = threading.Lock()
+        self._bastions, self._slots, self._ports = {}, {}, {}
+        self._local = threading.local()
+        self._retired, self.reconnects = [], 0
+
+    def _key(self, spec):
+        host, _, port = str(spec).strip().rpartition(":") if str(spec).count(":") == 1 else (str(spec).strip(), "", "")
+        return f"{host}:{int(port or self.default_port)}"
+
+    def members(self, jump):
+        """Bastion keys ("host:port") behind a jump spec."""
+        if jump in self.groups: return self.groups[jump]
+        return [self._key(b) for b in str(jump).split(",") if b.strip()]
+
+    @contextlib.contextmanager
+    def slot(self, jump, cancel=None):
+        """Holds one of the `limit` session slots of a bastion behind `jump` while a device runs:
+        a free slot on the least busy bastion, or the first one to free up. The device's channels
+        and forwards are opened through that bastion first (see _open). Setting the `cancel` event
+        stops the wait with DeviceAborted."""
+        keys = self._order(self.members(jump))
+        if not keys: raise ConnectionError(f"No jump host in '{jump}'")
+        key = next((k for k in keys if self._sem(k).acquire(blocking=False)), None)
+        while key is None:
+            if cancel is not None and cancel.is_set(): raise DeviceAborted(CANCELLED)
+            key = next((k for k in keys if self._sem(k).acquire(timeout=self.WAIT_STEP / len(keys))), None)
+        self._local.lease = key
+        try: yield key
+        finally:
+            if self._local.lease: self._sem(self._local.lease).release()
+            self._local.lease = None
+
+    def _sem(self, key):
+        with self._lock:
+            if key not in self._slots: self._slots[key] = threading.BoundedSemaphore(self.limit)
+            return self._slots[key]
+
+    def _lease(self, key, guard=None):
+        """Moves the calling device's slot to bastion `key`, waiting for a free one there. The old
+        slot is given up first, so devices moving between bastions never wait on each other; the
+        wait ends with DeviceAborted once the device's deadline `guard` trips."""
+        if self._local.lease == key: return
+        if not self._sem(key).acquire(blocking=False):
+            self._sem(self._local.lease).release(); self._local.lease = None
+            while not self._sem(key).acquire(timeout=self.WAIT_STEP):
+                if guard: guard.check()
+        else: self._sem(self._local.lease).release()
+        self._local.lease = key
+
+    def _bastion(self, key):
+        with self._lock: return self._bastions.setdefault(key, {'tunnels': [], 'opening': 0, 'down_until': 0, 'error': None,
+                                                                'lock': threading.Condition()})
+
+    def connect(self, jump):
+        """Opens the first transport of every bastion behind `jump`; ok if at least one is reachable."""
+        errors = []
+        for key in self.members(jump):
+            try: self._release(key, self._transport(key))
+            except Exception as e: errors.append(str(e))
+        if len(errors) == len(self.members(jump)): return False, "; ".join(errors) or f"No jump host in '{jump}'"
+        return True, "Jump Host Connected" + (f" (unreachable: {'; '.join(errors)})" if errors else "")
+
+    def _transport(self, key, exclude=None, guard=None):
+        """Least busy live transport of a bastion, opening or replacing one when needed. The SSH
+        connect runs outside the bastion lock, so devices keep using the live transports meanwhile;
+        a device that finds none waits for the one being opened instead of opening its own, until
+        its deadline `guard` trips."""
+        b = self._bastion(key)
+        with b['lock']:
+            while True:
+                for t in [t for t in b['tunnels'] if t is exclude or not t.alive()]:
+                    b['tunnels'].remove(t); self._retired.append(t); t.close()
+                    self.reconnects += 1
+                best = min(b['tunnels'], key=lambda t: t.active(), default=None)
+                down = time.monotonic() < b['down_until']
+                if not best and down: raise ConnectionError(f"jump host {key} unreachable ({b['error']})")
+                room = len(b['tunnels']) + b['opening'] < self.transports
+                if best and (not best.active() or not room or down):
+                    best.reserved += 1
+                    return best
+                if room: break
+                b['lock'].wait(self.WAIT_STEP)
+                if guard: guard.check()
+            b['opening'] += 1
+        host, port = key.rsplit(":", 1)
+        t = TunnelManager(host, port, self.user, self.password, self.buffer_size)
+        ok, msg = t.connect()
+        with b['lock']:
+            b['opening'] -= 1
+            b['lock'].notify_all()
+            if ok: b['tunnels'].append(t); best = t
+            else:
+                b['down_until'], b['error'] = time.monotonic() + self.RETRY_AFTER, msg
+                best = min(b['tunnels'], key=lambda t: t.active(), default=None)
+                if not best: raise ConnectionError(f"jump host {key}: {msg}")
+            best.reserved += 1
+            return best
+
+    def _release(self, key, t):
+        with self._bastion(key)['lock']: t.reserved -= 1
+
+    def _order(self, keys):
+        """Reachable bastions first, then by load."""
+        load = lambda key: sum(t.active() for t in self._bastion(key)['tunnels']) / self.transports
+        return sorted(keys, key=lambda k: (time.monotonic() < self._bastion(k)['down_until'], load(k)))
+
+    def _open(self, jump, fn, guard=None):
+        """Runs fn(transport) on the device's own bastion (see slot), or else the least busy one of
+        `jump`. An unreachable bastion falls through to the next member, moving the device's slot
+        with it; a transport that died under fn is replaced and retried after the other members.
+        Waits for a slot or transport end with DeviceAborted once the deadline `guard` trips."""
+        lease = getattr(self._local, 'lease', None)
+        keys = self._order(self.members(jump))
+        if lease in keys: keys.remove(lease); keys.insert(0, lease)
+        attempts, error = [(k, None) for k in keys], None
+        while attempts:
+            key, dead = attempts.pop(0)
+            try:
+                t = self._transport(key, exclude=dead, guard=guard)
+                if lease and self._local.lease != key:  # wait for a slot there without holding the transport
+                    self._release(key, t); self._lease(key, guard); t = self._transport(key, guard=guard)
+            except ConnectionError as e: error = e; continue
+            try: return t, fn(t)
+            except Exception as e:
+                if t.alive(): raise
+                error = e
+                if dead is None: attempts.append((key, t))
+            finally: self._release(key, t)
+        raise error or ConnectionError(f"No jump host in '{jump}'")
+
+    def open_channel(self, jump, target_host, target_port, guard=None):
+        return self._open(jump, lambda t: t.open_channel(target_host, target_port), guard)[1]
+
+    def start_forwarding(self, jump, target_host, target_port, guard=None):
+        t, port = self._open(jump, lambda t: t.start_forwarding(target_host, target_port), guard)
+        self._ports[port] = t
+        return port
+
+    def release(self, local_port):
+        t = self._ports.get(local_port)
+        if t: t.release(local_port)
+
+    def stats(self, local_port=None):
+        if local_port is not None:
+            t = self._ports.get(local_port)
+            return t.stats(local_port) if t else None
+        return [st for t in self._all() for st in t.stats()]
+
+    def _all(self):
+        with self._lock: bastions = list(self._bastions.values())
+        return self._retired + [t for b in bastions for t in b['tunnels']]
+
+    def describe(self):
+        with self._lock: bastions = dict(self._bastions)
+        return ", ".join(f"{k} x{len(b['tunnels'])}" for k, b in bastions.items() if b['tunnels'])
+
+    def close(self):
+        for t in self._all(): t.close()
+
+class _XmlPrettyHandler(xml.sax.handler.ContentHandler):
+    """SAX handler that re-indents XML as it is parsed (minidom.toprettyxml layout, constant memory)."""
+    def __init__(self, out):
+        super().__init__()
+        self.out, self.depth, self.text, self.children, self.open_tag = out, 0, [], [], False
+
+    def startDocument(self):
+        self.out.write('<?xml version="1.0" ?>')
+
+    def _close_open_tag(self):
+        if self.open_tag: self.out.write(">"); self.open_tag = False
+        text = "".join(self.text).strip(); self.text = []
+        if text: self.out.write("\n" + "\t" * self.depth + xml.sax.saxutils.escape(text))
+
+    def startElement(self, name, attrs):
+        if self.children:
+            self.children[-1] = True
+            self._close_open_tag()
+        attr = "".join(f" {k}={xml.sax.saxutils.quoteattr(v)}" for k, v in attrs.items())
+        self.out.write("\n" + "\t" * self.depth + f"<{name}{attr}")
+        self.children.append(False); self.depth += 1; self.open_tag = True
+
+    def characters(self, content):
+        self.text.append(content)
+
+    def endElement(self, name):
+        self.depth -= 1
+        if self.children.pop():
+            self._close_open_tag()
+            self.out.write("\n" + "\t" * self.depth + f"</{name}>")
+        else:
+            text = "".join(self.text).strip(); self.text = []
+            self.out.write(f">{xml.sax.saxutils.escape(text)}</{name}>" if text else "/>")
+            self.open_tag = False
+
+    def endDocument(self):
+        self.out.write("\n")
+
+class OutputFormatter:
+    """Streaming pretty-printers for retrieve outputs, used as a lazy post-step.
+    `chunks` is a callable returning an iterator of str chunks; it is called again to write the
+    raw fallback wrapper when the output turns out not to be valid JSON/XML."""
+    _JSON_TOKEN = re.compile(r'\s*(?:("(?:[^"\\]|\\.)*")|([{}\[\],:])|([^\s{}\[\],:"]+))')
+    _JSON_SCALAR = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null")
+
+    @staticmethod
+    def write(chunks, out, format_type):
+        start = out.tell()
+        try:
+            if format_type == "JSON": return OutputFormatter._json(chunks(), out)
+            if format_type == "XML": return OutputFormatter._xml(chunks(), out)
+            for c in chunks(): out.write(c)
+        except (ValueError, xml.sax.SAXException):
+            out.seek(start); out.truncate()
+            if format_type == "JSON":
+                out.write('{\n    "raw_output": "')
+                for c in chunks(): out.write(json.dumps(c)[1:-1])
+                out.write('"\n}')
+            else:
+                out.write("<output>\n")
+                for c in chunks(): out.write(c)
+                out.write("\n</output>")
+
+    @staticmethod
+    def _json(chunks, out, indent="    "):
+        """Re-indents JSON token by token (json.dumps(indent=4) layout); raises ValueError if invalid."""
+        depth, stack, just_opened, values, carry = 0, [], False, 0, ""
+        for chunk in chunks:
+            buf, pos = carry + chunk, 0
+            while True:
+                m = OutputFormatter._JSON_TOKEN.match(buf, pos)
+                if not m or (m.end() == len(buf) and not m.group(2)): break
+                pos = m.end()
+                tok = m.group(1) or m.group(2) or m.group(3)
+                if tok in "}]" and m.group(2):
+                    if not stack or stack.pop() != tok: raise ValueError("Unbalanced JSON")
+                    depth -= 1
+                    out.write(tok if just_opened else "\n" + indent * depth + tok)
+                    just_opened = False
+                    continue
+                if just_opened: out.write("\n" + indent * depth); just_opened = False
+                if tok == ",": out.write(",\n" + indent * depth)
+                elif tok == ":": out.write(": ")
+                else:
+                    if depth == 0:
+                        values += 1
+                        if values > 1: raise ValueError("Extra data after JSON value")
+                    if tok in "{[" and m.group(2):
+                        stack.append("}" if tok == "{" else "]"); depth += 1; just_opened = True
+                        out.write(tok)
+                    elif m.group(3) and not OutputFormatter._JSON_SCALAR.fullmatch(tok): raise ValueError(f"Bad JSON token {tok[:20]!r}")
+                    else: out.write(tok)
+            carry = buf[pos:]
+        last = carry.strip()
+        if last:
+            if depth or values or not (OutputFormatter._JSON_SCALAR.fullmatch(last) or (last.startswith('"') and last.endswith('"') and len(last) > 1)):
+                raise ValueError("Truncated JSON")
+            out.write(last); values += 1
+        if stack or not values: raise ValueError("Truncated JSON")
+
+    @staticmethod
+    def _xml(chunks, out):
+        import xml.sax.saxutils
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(_XmlPrettyHandler(out))
+        for chunk in chunks: parser.feed(chunk)
+        parser.close()
+
+TEMPLATE_CACHE_DIR = os.path.join(".collexa_cache", "jinja")
+REPORT_CACHE_FILE = os.path.join(".collexa_cache", "report_cache.json")
+# Small <get> used to prove a device is still manageable after a confirmed commit
+NETCONF_CONNECT_TIMEOUT = 30
+NETCONF_PING_FILTER = '<netconf-state xmlns="urn:ietf:params:xml:ns:yang:ietf-netconf-monitoring"><statistics/></netconf-state>'
+_template_envs = {}
+_template_lock = threading.Lock()
+
 class NetworkRunner:
     @staticmethod
-    def render_config(template_path, context):
-        with open(template_path, 'r') as f: return Template(f.read()).render(**context)
+    def template_env(template_dir, strict=False):
+        """Shared jinja2 Environment per template directory: templates compile once per process,
+        bytecode is cached on disk across runs, and {% include %}/{% import %} resolve from the directory."""
+        key = (os.path.abspath(template_dir), strict)
+        with _template_lock:
+            if key not in _template_envs:
+                from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, StrictUndefined, Undefined
+                os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+                _template_envs[key] = Environment(loader=FileSystemLoader(key[0]),
+                                                  bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+                                                  undefined=StrictUndefined if strict else Undefined)
+            return _template_envs[key]
+
+    @staticmethod
+    def render_config(template_path, context, strict=False):
+        path = os.path.abspath(template_path)
+        template = NetworkRunner.template_env(os.path.dirname(path), strict).get_template(os.path.basename(path))
+        return template.render(**context)
+
+    @staticmethod
+    def prerender(template_path, rows, out_dir):
+        """Renders every row with StrictUndefined and writes <out_dir>/<host>.cfg.
+        Returns ({host: config}, [(host, error), ...])."""
+        rendered, errors = {}, []
+        os.makedirs(out_dir, exist_ok=True)
+        for row in rows:
+            host = str(row.get('ip') or row.get('host'))
+            try: rendered[host] = NetworkRunner.render_config(template_path, row, strict=True)
+            except Exception as e: errors.append((host, f"{type(e).__name__}: {e}")); continue
+            with open(os.path.join(out_dir, f"{host}.cfg"), "w") as f: f.write(rendered[host])
+        return rendered, errors
     
     @staticmethod
     def json_to_xml(json_data):
@@ -120,94 +656,715 @@ class NetworkRunner:
         return ET.tostring(root, encoding='unicode')
 
     @staticmethod
-    def push_ssh(device_info, commands):
+    def push_ssh(device_info, commands, read_timeout=90, timings=None, diff=False, method="interactive", guard=None, reopen=None):
+        """Sends a config set. Connection timings (global_delay_factor etc.) come from device_info;
+        `timings`, when given, is filled with the measured connect and per-line response seconds
+        and the number of config 'lines' sent ('rendered': non-blank lines before any diff). With `diff`, the running config is read first in the
+        same session and only the missing lines are sent (none when the device is up to date).
+        `method` 'bulk' (or 'auto' for long configs) copies the lines to the device as one file and
+        applies it on the box (see bulkpush); when the transfer fails, or the platform has no file
+        transfer, the lines are sent interactively and timings['fallback'] says why; the file goes
+        over its own SSH login, through the connection params from `reopen()` when given (needed
+        behind a jump host). `guard` (see deadline.Deadline) gets a closer that aborts the session."""
+        timings = {} if timings is None else timings
         try:
             device_info.setdefault('global_delay_factor', 4)
-            net_connect = ConnectHandler(**device_info)
-            if isinstance(commands, str): commands = commands.splitlines()
-            output = net_connect.send_config_set(commands, read_timeout=90)
-            net_connect.disconnect()
-            return True, output
+            t0 = time.monotonic()
+            net_connect = NetworkRunner.connect_ssh(device_info, guard)
+            timings['connect'] = time.monotonic() - t0
+            try:
+                if isinstance(commands, str): commands = commands.splitlines()
+                t0 = time.monotonic()
+                timings['rendered'] = sum(1 for l in commands if l.strip())
+                if diff:
+                    running = net_connect.send_command(running_config_command(device_info.get('device_type')), read_timeout=read_timeout)
+                    commands = config_delta("\n".join(commands), running)
+                ok, output = True, ""
+                timings['method'] = "interactive"
+                if commands and use_bulk(method, device_info.get('device_type'), len(commands)):
+                    try:
+                        ok, output = bulk_push(net_connect, device_info['device_type'], commands, read_timeout, reopen)
+                        timings['method'] = "bulk"
+                    except TransferError as e: timings['fallback'] = f"file transfer failed ({e})"
+                elif commands and method == "bulk": timings['fallback'] = f"no file transfer for {device_info.get('device_type')}"
+                if commands and timings['method'] == "interactive":
+                    output = net_connect.send_config_set(commands, read_timeout=read_timeout)
+                    timings['response'] = (time.monotonic() - t0) / max(1, len(commands))
+                timings['execute'] = time.monotonic() - t0
+                timings['lines'] = len(commands)
+            finally: net_connect.disconnect()
+            return ok, output
+        except Exception as e:
+            timings['timed_out'] = "Timeout" in type(e).__name__
+            return False, str(e)
+
+    @staticmethod
+    def split_netconf_config(xml_config):
+        """A rendered NETCONF template may hold several top-level <config> elements; each becomes its
+        own edit-config in the same session and commit. Only the document's root elements are
+        split (a nested 'config' container stays inside its block); a single root, or anything
+        that does not parse, is sent unchanged."""
+        body = re.sub(r"^\s*<\?xml[^>]*\?>", "", xml_config)
+        try: roots = list(ET.fromstring(f"<collexa-root>{body}</collexa-root>"))
+        except ET.ParseError: return [xml_config]
+        if len(roots) < 2 or any(r.tag.rsplit("}", 1)[-1] != "config" for r in roots): return [xml_config]
+        for r in roots: r.tail = None
+        return [ET.tostring(r, encoding="unicode") for r in roots]
+
+    @staticmethod
+    def netconf_target(m, target="auto"):
+        """'auto' edits running where it is writable and the candidate datastore otherwise."""
+        if target != "auto": return target
+        caps = m.server_capabilities
+        return "running" if ":writable-running" in caps or ":candidate" not in caps else "candidate"
+
+    @staticmethod
+    def push_netconf(device_info, xml_config, timings=None, target="auto", confirm_timeout=0, guard=None, reopen=None):
+        """One session per device: lock, every edit-config, then for the candidate datastore validate
+        (when supported) and commit. With `confirm_timeout` the commit is a confirmed commit, and it
+        is confirmed only once a fresh session (connection params from `reopen()`, by default
+        device_info) answers a <get>; otherwise the session ends unconfirmed and the device rolls
+        back. Uncommitted candidate changes are discarded on failure."""
+        timings = {} if timings is None else timings
+        try:
+            from ncclient import manager
+            t0 = time.monotonic()
+            params = NetworkRunner.netconf_params(device_info)
+            if guard: guard.watch(lambda: NetworkRunner.close_socket(params['sock']))
+            with manager.connect(**params) as m:
+                timings['connect'], t0 = time.monotonic() - t0, time.monotonic()
+                timings['platform'] = netconf_hint(m.server_capabilities)
+                target = NetworkRunner.netconf_target(m, target)
+                blocks, steps = NetworkRunner.split_netconf_config(xml_config), []
+                m.lock(target)
+                try:
+                    try:
+                        for block in blocks: m.edit_config(target=target, config=block)
+                        steps.append(f"{len(blocks)} edit{'s' if len(blocks) > 1 else ''} to {target}")
+                        if target == "candidate":
+                            if ":validate" in m.server_capabilities: m.validate(source="candidate"); steps.append("validated")
+                            if confirm_timeout and ":confirmed-commit" in m.server_capabilities:
+                                m.commit(confirmed=True, timeout=str(int(confirm_timeout)))
+                                steps.append(f"confirmed commit ({int(confirm_timeout)}s)")
+                                ok, err = NetworkRunner.netconf_reachable(reopen() if reopen else dict(device_info), min(30, confirm_timeout / 3), guard)
+                                if not ok: return False, ", ".join(steps) + f", not confirmed: device unreachable after commit ({err}); rolling back"
+                                m.commit(); steps.append("confirmed after reachability check")
+                            else: m.commit(); steps.append("committed")
+                    except Exception:
+                        if target == "candidate":
+                            try: m.discard_changes()
+                            except Exception: pass
+                        raise
+                finally: m.unlock(target)
+                timings['execute'] = time.monotonic() - t0
+                return True, ", ".join(steps)
         except Exception as e: return False, str(e)
 
     @staticmethod
-    def push_netconf(device_info, xml_config):
+    def netconf_reachable(device_info, timeout, guard=None):
+        """Opens a new NETCONF session and sends a small <get>, both within `timeout` seconds (the
+        socket is closed when time runs out, so a stalled SSH handshake cannot outlast it). Any
+        reply, an rpc-error included, shows the device can still be managed. Returns (ok, error)."""
+        end, expired = time.monotonic() + timeout, threading.Event()
+        try:
+            from ncclient import manager
+            from ncclient.operations import RPCError
+            params = NetworkRunner.netconf_params(device_info, timeout)
+            if guard: guard.watch(lambda: NetworkRunner.close_socket(params['sock']))
+            timer = threading.Timer(timeout, lambda: (expired.set(), NetworkRunner.close_socket(params['sock'])))
+            timer.daemon = True; timer.start()
+            try:
+                with manager.connect(**params) as m:
+                    m.timeout = max(1, end - time.monotonic())
+                    try: m.get(filter=("subtree", NETCONF_PING_FILTER))
+                    except RPCError: pass
+            finally: timer.cancel()
+            return True, None
+        except Exception as e: return False, f"no answer within {timeout:g}s" if expired.is_set() else str(e) or type(e).__name__
+
+    @staticmethod
+    def load_netconf_ops(source):
+        """NETCONF retrieve operations from a filter field: one or more filter files (.xml, or .json
+        converted to XML) separated by ';', each optionally prefixed 'get:' for operational state
+        (default 'get-config:'). Returns [(name, operation, filter_xml)]."""
+        ops = []
+        for item in [i.strip() for i in str(source or "").split(";") if i.strip()]:
+            op, sep, path = item.partition(":")
+            if not sep or op not in ("get", "get-config"): op, path = "get-config", item
+            with open(path.strip(), 'r') as f:
+                xml_filter = NetworkRunner.json_to_xml(json.load(f)) if path.strip().endswith('.json') else f.read()
+            ops.append((op, path.strip(), xml_filter))
+        if len(ops) == 1: return [(ops[0][0], ops[0][0], ops[0][2])]
+        return [(f"{op} {os.path.splitext(os.path.basename(path))[0]}", op, xml_filter) for op, path, xml_filter in ops]
+
+    @staticmethod
+    def retrieve_netconf(device_info, ops, timings=None, guard=None):
+        """Runs every (name, operation, filter) over one session; a plain filter string runs one
+        get-config and returns its data, a list returns (True, [(name, data_xml), ...])."""
+        timings = {} if timings is None else timings
+        single = isinstance(ops, str)
         try:
-            with manager.connect(**device_info, hostkey_verify=False, device_params={'name':'default'}) as m:
-                return True, str(m.edit_config(target='running', config=xml_config))
+            from ncclient import manager
+            t0 = time.monotonic()
+            params = NetworkRunner.netconf_params(device_info)
+            if guard: guard.watch(lambda: NetworkRunner.close_socket(params['sock']))
+            with manager.connect(**params) as m:
+                timings['connect'], t0 = time.monotonic() - t0, time.monotonic()
+                timings['platform'] = netconf_hint(m.server_capabilities)
+                outputs = []
+                for name, op, xml_filter in [("get-config", "get-config", ops)] if single else ops:
+                    response = m.get(filter=xml_filter) if op == "get" else m.get_config(source='running', filter=xml_filter)
+                    outputs.append((name, response.data_xml))
+                timings['execute'] = time.monotonic() - t0
+                return True, outputs[0][1] if single else outputs
         except Exception as e: return False, str(e)
 
     @staticmethod
-    def retrieve_netconf(device_info, xml_filter):
+    def connect_ssh(device_info, guard=None):
+        """ConnectHandler, with the session registered on `guard` before login so a hung banner,
+        auth or session preparation can be aborted too. A netmiko without deferred login
+        (auto_connect / _open) is only abortable once logged in."""
+        from netmiko import ConnectHandler
+        if not guard: return ConnectHandler(**device_info)
+        try: conn = ConnectHandler(**device_info, auto_connect=False)
+        except TypeError: conn = None
+        if conn is None or not callable(getattr(conn, '_open', None)):
+            conn = ConnectHandler(**device_info)
+            guard.watch(lambda: NetworkRunner.abort_ssh(conn))
+            return conn
+        guard.watch(lambda: NetworkRunner.abort_ssh(conn))
+        conn._open()
+        guard.check()
+        return conn
+
+    @staticmethod
+    def detect_ssh(device_info, guard=None):
+        """Probes a device with netmiko's SSHDetect. Returns (True, device_type or None when no
+        platform matched) or (False, error)."""
         try:
-            with manager.connect(**device_info, hostkey_verify=False, device_params={'name':'default'}) as m:
-                response = m.get_config(source='running', filter=xml_filter)
-                return True, response.data_xml
+            from netmiko import SSHDetect
+            guesser = SSHDetect(**dict(device_info, device_type="autodetect"))
+            try:
+                if guard: guard.watch(lambda: NetworkRunner.abort_ssh(guesser.connection))
+                return True, guesser.autodetect()
+            finally: guesser.connection.disconnect()
         except Exception as e: return False, str(e)
 
     @staticmethod
-    def retrieve_ssh(device_info, command, format_type):
+    def abort_ssh(conn):
+        """Closes a netmiko session from another thread by closing its SSH client (remote_conn_pre),
+        which ends the transport. netmiko would still poll the dead channel until its read
+        timeout, so where its channel wrapper exposes remote_conn (netmiko 4) that is detached too,
+        making the next read fail at once. Each step is skipped if this netmiko lacks it."""
+        for step in (lambda: setattr(conn.channel, 'remote_conn', None) if hasattr(getattr(conn, 'channel', None), 'remote_conn') else None,
+                     lambda: conn.remote_conn.close(),
+                     lambda: conn.remote_conn_pre.close()):
+            try: step()
+            except Exception: pass
+
+    @staticmethod
+    def netconf_params(device_info, timeout=None):
+        """manager.connect kwargs over a socket opened here, or over the jump channel already in
+        device_info. Closing params['sock'] (close_socket) aborts the session from any thread:
+        ncclient's reader sees the session end and fails a pending RPC right away."""
+        params = {'hostkey_verify': False, 'device_params': {'name':'default'}, **device_info}
+        if timeout: params['timeout'] = timeout
+        if not params.get('sock'):
+            params['sock'] = socket.create_connection((params['host'], int(params.get('port') or 830)), timeout or NETCONF_CONNECT_TIMEOUT)
+        return params
+
+    @staticmethod
+    def close_socket(sock):
+        """Closes a socket or jump channel from another thread; shutdown() wakes a blocked reader."""
+        if isinstance(sock, socket.socket):
+            try: sock.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+        sock.close()
+
+    @staticmethod
+    def stream_command(conn, command, prompt, out, read_timeout=90):
+        """Sends one command on an open netmiko session and writes the output to `out` as it
+        arrives, stripping the echoed command and the trailing prompt like send_command does.
+        Only a prompt-sized tail is held back, so memory stays flat however large the output is.
+        `read_timeout` is the longest silence tolerated between chunks. Returns the seconds until
+        the first output arrived."""
+        conn.write_channel(conn.normalize_cmd(command))
+        pending, echo_done, hold = "", False, len(prompt) + 2
+        sent = time.monotonic()
+        deadline, first = sent + read_timeout, None
+        while True:
+            data = conn.read_channel()
+            if not data:
+                if time.monotonic() > deadline:
+                    from netmiko.exceptions import ReadTimeout
+                    raise ReadTimeout(f"No output from '{command}' for {read_timeout}s")
+                time.sleep(0.05); continue
+            now = time.monotonic()
+            deadline, first = now + read_timeout, now - sent if first is None else first
+            pending = (pending + data).replace("\r\r\n", "\n").replace("\r\n", "\n")
+            if not echo_done:
+                i = pending.find("\n")
+                if i < 0: continue
+                pending, echo_done = pending[i + 1:], True
+            tail = pending.rstrip()
+            if tail.endswith(prompt):
+                body = tail[:-len(prompt)]
+                out.write(body[:-1] if body.endswith("\n") else body)
+                return first
+            cut = len(pending) - hold
+            if cut > 0:
+                if pending[cut - 1] == "\r": cut -= 1
+                out.write(pending[:cut]); pending = pending[cut:]
+
+    @staticmethod
+    def retrieve_ssh_stream(device_info, commands, spool_dir, read_timeout=90, timings=None, guard=None):
+        """Runs commands over one session, streaming each output to its own spool file in
+        spool_dir. Returns (True, [(command, path), ...]); formatting is left to a later step.
+        `timings`, when given, is filled with the measured connect, prompt and (slowest
+        first-output) response seconds."""
+        spooled, timings = [], {} if timings is None else timings
         try:
             device_info.setdefault('global_delay_factor', 4)
-            net_connect = ConnectHandler(**device_info)
-            raw_output = net_connect.send_command(command, read_timeout=90)
-            net_connect.disconnect()
-            
-            final_output = raw_output
-            if format_type == "JSON":
-                try: final_output = json.dumps(json.loads(raw_output), indent=4)
-                except: final_output = json.dumps({"raw_output": raw_output}, indent=4)
-            elif format_type == "XML":
-                try: final_output = xml.dom.minidom.parseString(raw_output).toprettyxml()
-                except: final_output = f"<output>\n{raw_output}\n</output>"
-            return True, final_output
-        except Exception as e: return False, str(e)
+            t0 = time.monotonic()
+            net_connect = NetworkRunner.connect_ssh(device_info, guard)
+            timings['connect'] = time.monotonic() - t0
+            try:
+                t0 = time.monotonic()
+                prompt = net_connect.find_prompt()
+                timings['prompt'], t0 = time.monotonic() - t0, time.monotonic()
+                for cmd in commands:
+                    fd, path = tempfile.mkstemp(dir=spool_dir, suffix=".raw")
+                    spooled.append((cmd, path))
+                    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                        first = NetworkRunner.stream_command(net_connect, cmd, prompt, f, read_timeout)
+                    timings['response'] = max(timings.get('response') or 0, first or 0)
+                timings['execute'] = time.monotonic() - t0
+            finally: net_connect.disconnect()
+            return True, spooled
+        except Exception as e:
+            timings['timed_out'] = "Timeout" in type(e).__name__
+            for _, path in spooled:
+                try: os.remove(path)
+                except OSError: pass
+            return False, str(e)
+
+    @staticmethod
+    def load_commands(source):
+        """Splits a command field into a list: a path to a file (one command per line, '#' comments)
+        or inline commands separated by ';' or newlines."""
+        source = str(source or "").strip()
+        if source and os.path.isfile(source):
+            with open(source, 'r') as f: source = f.read()
+        return [c.strip() for c in re.split(r"[;\n]", source) if c.strip() and not c.strip().startswith("#")]
+
+    @staticmethod
+    def command_slug(command):
+        return re.sub(r"[^A-Za-z0-9]+", "_", command).strip("_")[:60] or "output"
+
+class RegexExtractor:
+    """The Text-mode regex sheet, compiled once per process. Each stored output is decompressed
+    once into a spool file (kept in memory below MMAP_THRESHOLD, memory-mapped above it) and every
+    pattern runs over that single buffer.
+    Value patterns keep their first match: group 1, group 0 without groups, or one column per
+    named group. Table patterns emit one report row per match, columns from their groups."""
+    MMAP_THRESHOLD = 8 * 1024 * 1024
+    _cache = {}
+
+    def __init__(self, spec):
+        self.spec = [tuple(s) for s in spec]
+        self._compiled = {}
+
+    @classmethod
+    def for_spec(cls, spec):
+        key = tuple(tuple(s) for s in spec)
+        if key not in cls._cache: cls._cache[key] = cls(key)
+        return cls._cache[key]
+
+    def _patterns(self, binary):
+        """(values, tables) compiled for str buffers, or for bytes when the file is mmapped."""
+        if binary not in self._compiled:
+            comp = lambda rx: re.compile(rx.encode() if binary else rx, re.MULTILINE)
+            self._compiled[binary] = ([(c, comp(rx)) for c, rx, kind in self.spec if kind != "table"],
+                                      [(c, comp(rx)) for c, rx, kind in self.spec if kind == "table"])
+        return self._compiled[binary]
+
+    @staticmethod
+    def _text(v):
+        return v.decode('utf-8', errors='replace') if isinstance(v, bytes) else v
+
+    @staticmethod
+    def _groups(col, m, table=False):
+        """Named groups give one column each; a table pattern's unnamed groups give col_1..col_n.
+        Otherwise the value is group 1 (group 0 without groups) under the sheet's column."""
+        if m.re.groupindex: return {name: RegexExtractor._text(m.group(name)) for name in m.re.groupindex}
+        if table and m.re.groups > 1: return {f"{col}_{i}": RegexExtractor._text(g) for i, g in enumerate(m.groups(), 1)}
+        return {col: RegexExtractor._text(m.group(1) if m.re.groups else m.group(0))}
+
+    def _scan(self, buf, values, table_rows):
+        value_pats, table_pats = self._patterns(isinstance(buf, mmap.mmap))
+        for col, pat in value_pats:
+            if col in values: continue
+            m = pat.search(buf)
+            if m: values[col] = self._groups(col, m)
+        for col, pat in table_pats:
+            table_rows.extend(self._groups(col, m, True) for m in pat.finditer(buf))
+
+    def extract(self, host, sources):
+        values, table_rows = {}, []
+        for _, result_id in sources:
+            with tempfile.SpooledTemporaryFile(max_size=self.MMAP_THRESHOLD) as spool:
+                if ReportGenerator._store().spool_output(result_id, spool) >= self.MMAP_THRESHOLD:
+                    buf = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    spool.seek(0); buf = spool.read().decode('utf-8', errors='replace')
+                try: self._scan(buf, values, table_rows)
+                finally:
+                    if isinstance(buf, mmap.mmap): buf.close()
+
+        base = {'Device_IP': host}
+        for col, pat in self._patterns(False)[0]:  # a miss fills the same columns a match would
+            base.update(values.get(col) or {name: "N/A" for name in pat.groupindex} or {col: "N/A"})
+        return [dict(base, **t) for t in table_rows] or [base]
+
+class XPathExtractor:
+    """The NETCONF/XML column spec, evaluated over a pull parser so a reply is never held whole.
+    Paths are '/'-separated steps ('prefix:name', 'name' in any namespace, or '*'); a leading '//'
+    matches at any depth, and a trailing '/@attr' or '/text()' picks what is read. Prefixes come from
+    'xmlns:<prefix>' rows. A 'row' path expands each matching list entry into its own report row,
+    with relative column paths read inside that entry; absolute paths give one value per host."""
+    _cache = {}
+
+    def __init__(self, spec):
+        self.spec = [tuple(s) for s in spec]
+        self._seen = {}
+        self.ns = {c.split(":", 1)[1] if ":" in c else "": uri for c, uri, kind in self.spec if kind == "ns"}
+        rows = [self._compile(x) for c, x, kind in self.spec if kind == "row"]
+        self.row = rows[0] if rows else None
+        self.values, self.relative = [], []
+        for c, x, kind in self.spec:
+            if kind != "value": continue
+            if self.row and not x.startswith("/"): self.relative.append((c, self._compile(x)))
+            else: self.values.append((c, self._compile(x if x.startswith("/") else "//" + x)))
+
+    @classmethod
+    def for_spec(cls, spec):
+        key = tuple(tuple(s) for s in spec)
+        if key not in cls._cache: cls._cache[key] = cls(key)
+        return cls._cache[key]
+
+    def _compile(self, xpath):
+        """'//if:interface/if:name' -> (anywhere, [(uri or None, local), ...], attribute or None)."""
+        path, attr = xpath.strip(), None
+        if path.endswith("/text()"): path = path[:-7]
+        if "/@" in path: path, attr = path.rsplit("/@", 1); attr = self._qname(attr)
+        if path.startswith("./"): path = path[1:] if path.startswith(".//") else path[2:]
+        anywhere = path.startswith("//")
+        return anywhere, [self._qname(step) for step in path.strip("/").split("/") if step and step != "."], attr
+
+    def _qname(self, step):
+        if ":" not in step: return (None, step)
+        prefix, local = step.split(":", 1)
+        if prefix not in self.ns: raise ValueError(f"Unknown namespace prefix '{prefix}' (add an xmlns:{prefix} row)")
+        return (self.ns[prefix], local)
+
+    def _match(self, tag, step):
+        """Memoized per (tag, step): a reply repeats a handful of tags many thousands of times."""
+        hit = self._seen.get((tag, step))
+        if hit is None:
+            uri, local = tag[1:].split("}", 1) if tag.startswith("{") else (None, tag)
+            hit = self._seen[(tag, step)] = (step[1] == "*" or step[1] == local) and (step[0] is None or step[0] == uri)
+        return hit
+
+    def _matches(self, stack, path):
+        anywhere, steps, _ = path
+        n = len(steps)
+        if len(stack) < n or (not anywhere and len(stack) != n): return False
+        return all(self._match(stack[i - n], steps[i]) for i in range(n))
+
+    @staticmethod
+    def _value(elem, attr):
+        if attr is None: return (elem.text or "").strip()
+        if attr[0] is None: return next((v for k, v in elem.attrib.items() if k.rsplit("}", 1)[-1] == attr[1]), None)
+        return elem.get("{%s}%s" % attr)
+
+    def _find(self, elem, path):
+        """First match of a relative path inside one (small, fully built) list entry."""
+        anywhere, steps, attr = path
+        found = [elem]
+        for i, step in enumerate(steps):
+            pool = (d for e in found for d in e.iter() if d is not e) if anywhere and i == 0 else (c for e in found for c in e)
+            found = [c for c in pool if self._match(c.tag, step)]
+            if not found: return None
+        return XPathExtractor._value(found[0], attr)
+
+    def extract(self, host, chunk_sources):
+        """chunk_sources yields one callable per result source, returning its text chunks."""
+        values, rows, pending = {}, [], self.values
+        for chunks in chunk_sources:
+            parser = ET.XMLPullParser(events=("start", "end"))
+            tags, elems, row_depth = [], [], None
+            for chunk in chunks():
+                parser.feed(chunk)
+                for event, elem in parser.read_events():
+                    if event == "start":
+                        tags.append(elem.tag); elems.append(elem)
+                        if row_depth is None and self.row and self._matches(tags, self.row): row_depth = len(tags)
+                        continue
+                    for col, path in pending:
+                        if col not in values and self._matches(tags, path):
+                            v = self._value(elem, path[2])
+                            if v is not None: values[col] = v
+                    if len(values) == len(pending): pending = ()
+                    if row_depth == len(tags):
+                        rows.append({col: self._find(elem, path) for col, path in self.relative})
+                        row_depth = None
+                    if row_depth is None and len(elems) > 1:
+                        elem.clear(); elems[-2].remove(elem)
+                    tags.pop(); elems.pop()
+            parser.close()
+
+        base = {'Device_IP': host}
+        for col, _ in self.values: base[col] = values.get(col, "N/A")
+        return [dict(base, **{k: ("N/A" if v is None else v) for k, v in r.items()}) for r in rows] or [base]
 
 class ReportGenerator:
+    OUTPUT_FORMATS = ("xlsx", "csv", "parquet")
+    POOL_THRESHOLD = 32
+    _reader = None
+
+    @staticmethod
+    def _section(path, ext):
+        """Column prefix for per-command files ('01_show_version.json' -> 'show_version')."""
+        name = os.path.basename(path)[:-len(ext) - 1]
+        return re.sub(r"^\d+_", "", name)
+
+    @staticmethod
+    def _read_sheet(path):
+        """Header and data rows of a spec sheet (.xlsx or .csv)."""
+        if path.lower().endswith('.csv'):
+            import csv
+            with open(path, 'r', newline='', encoding='utf-8-sig') as f: rows = list(csv.reader(f))
+        else:
+            from openpyxl import load_workbook
+            wb = load_workbook(path, read_only=True, data_only=True)
+            try: rows = list(wb.active.iter_rows(values_only=True))
+            finally: wb.close()
+        if not rows: return [], []
+        return [str(h).strip() if h is not None else "" for h in rows[0]], rows[1:]
+
+    @staticmethod
+    def _spec(path, expr_header, kinds):
+        header, rows = ReportGenerator._read_sheet(path)
+        if not header: return []
+        ci, ri = header.index('Column'), header.index(expr_header)
+        ti = header.index('Type') if 'Type' in header else None
+        spec = []
+        for r in rows:
+            if len(r) <= max(ci, ri) or r[ci] in (None, "") or r[ri] in (None, ""): continue
+            kind = str(r[ti]).strip().lower() if ti is not None and ti < len(r) and r[ti] else "value"
+            spec.append([str(r[ci]).strip(), str(r[ri]).strip(), kind if kind in kinds else "value"])
+        return spec
+
+    @staticmethod
+    def load_patterns(regex_path):
+        """Reads the regex sheet (.xlsx or .csv) into [[column, regex, type], ...]. The optional
+        'Type' column is 'value' (default, first match) or 'table' (one report row per match)."""
+        return ReportGenerator._spec(regex_path, 'Regex', ("table",))
+
+    @staticmethod
+    def load_xpaths(xpath_path):
+        """Reads the XML column sheet (Column, XPath, optional Type) into [[column, xpath, type], ...].
+        Type 'row' marks the list whose entries become report rows; 'xmlns:<prefix>' columns
+        declare namespace prefixes (the XPath cell holds the URI)."""
+        spec = ReportGenerator._spec(xpath_path, 'XPath', ("row",))
+        return [[c, x, "ns" if c.startswith("xmlns") else k] for c, x, k in spec]
+
     @staticmethod
-    def generate_excel_report(format_type, regex_excel_path=None):
+    def _store():
+        """The results store opened by this process for reading report sources."""
+        if ReportGenerator._reader is None:
+            from .store import ResultsStore
+            ReportGenerator._reader = ResultsStore()
+        return ReportGenerator._reader
+
+    @staticmethod
+    def _close_store():
+        if ReportGenerator._reader is not None: ReportGenerator._reader.close(); ReportGenerator._reader = None
+
+    @staticmethod
+    def _chunks(source):
+        """A result source is a (name, result_id) pair from the results store."""
+        return ReportGenerator._store().iter_output(source[1])
+
+    @staticmethod
+    def _read(source):
+        """Whole output as one str; only JSON, which has to be parsed in one piece, reads this way."""
+        return "".join(ReportGenerator._chunks(source))
+
+    @staticmethod
+    def _xml_leaves(files, name):
+        """Spec-less XML: leaf children of each reply's root, read with a pull parser."""
+        row = {}
+        for f in files:
+            prefix = "" if len(files) == 1 else ReportGenerator._section(name(f), "xml") + "."
+            try:
+                parser, depth = ET.XMLPullParser(events=("start", "end")), 0
+                for chunk in ReportGenerator._chunks(f):
+                    parser.feed(chunk)
+                    for event, elem in parser.read_events():
+                        if event == "start": depth += 1; continue
+                        if depth == 2 and len(elem) == 0: row[prefix + elem.tag] = elem.text
+                        if depth >= 2: elem.clear()
+                        depth -= 1
+                parser.close()
+            except: pass
+        return row
+
+    @staticmethod
+    def _extract_batch(format_type, items, patterns):
+        """Pool task: parses a batch of (host, sources) and closes the store reader it opened."""
+        try: return [ReportGenerator._extract_host(format_type, h, f, patterns) for h, f in items]
+        finally: ReportGenerator._close_store()
+
+    @staticmethod
+    def _extract_host(format_type, host, files, patterns):
+        """Parses one host's result sources into a report row, or a list of rows for Text mode
+        (None if nothing usable). Module-level callable so it can run in a process pool."""
+        name = lambda f: f[0]
+        if format_type == "JSON":
+            row = {}
+            for f in files:
+                try:
+                    text = ReportGenerator._read(f)
+                    try: d = json.loads(text)
+                    except ValueError: d = {"raw_output": text}
+                    if isinstance(d, dict):
+                        if len(files) == 1: row.update(d)
+                        else: row[ReportGenerator._section(name(f), "json")] = d
+                except: pass
+            if not row: return None
+            row['Device_IP'] = host
+            return row
+        elif format_type == "XML":
+            if patterns:
+                try: return XPathExtractor.for_spec(patterns).extract(host, [lambda f=f: ReportGenerator._chunks(f) for f in files])
+                except ET.ParseError: return None
+            return dict(ReportGenerator._xml_leaves(files, name), Device_IP=host)
+        return RegexExtractor.for_spec(patterns).extract(host, files)
+
+    @staticmethod
+    def _flatten(row, prefix=""):
+        """Dotted-key flattening of nested dicts: {'a': {'b': 1}} -> {'a.b': 1}."""
+        flat = {}
+        for k, v in row.items():
+            key = f"{prefix}{k}"
+            if isinstance(v, dict) and v: flat.update(ReportGenerator._flatten(v, key + "."))
+            else: flat[key] = v
+        return flat
+
+    @staticmethod
+    def _write(rows, out, output_format):
+        columns = {}
+        for r in rows:
+            for k in r: columns.setdefault(k, None)
+        columns = list(columns)
+        cell = lambda v: v if v is None or isinstance(v, (str, int, float, bool)) else json.dumps(v) if isinstance(v, (list, dict)) else str(v)
+        if output_format == "csv":
+            import csv
+            with open(out, 'w', newline='', encoding='utf-8') as f:
+                w = csv.writer(f)
+                w.writerow(columns)
+                for r in rows: w.writerow(["" if r.get(c) is None else cell(r.get(c)) for c in columns])
+        elif output_format == "parquet":
+            try: import pyarrow as pa, pyarrow.parquet as pq
+            except ImportError: raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+            data = {c: [cell(r.get(c)) for r in rows] for c in columns}
+            try: table = pa.table(data)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                table = pa.table({c: [None if v is None else str(v) for v in vals] for c, vals in data.items()})
+            pq.write_table(table, out)
+        else:
+            from openpyxl import Workbook
+            from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet()
+            ws.append(columns)
+            for r in rows:
+                vals = [cell(r.get(c)) for c in columns]
+                ws.append([ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v for v in vals])
+            wb.save(out)
+
+    @staticmethod
+    def _load_cache():
         try:
-            if not os.path.exists("results"): return False, "No results folder found."
-            data_rows = []
-            
-            if format_type == "JSON":
-                files = glob.glob("results/*.json")
-                for f in files:
-                    try:
-                        with open(f, 'r') as jf:
-                            d = json.load(jf)
-                            if isinstance(d, dict): 
-                                d['Device_IP'] = os.path.basename(f).replace('.json','')
-                                data_rows.append(d)
-                    except: pass
-            elif format_type == "XML":
-                files = glob.glob("results/*.xml")
-                for f in files:
-                    try:
-                        tree = ET.parse(f)
-                        root = tree.getroot()
-                        row = {'Device_IP': os.path.basename(f).replace('.xml','')}
-                        for child in root:
-                            if len(child) == 0: row[child.tag] = child.text
-                        data_rows.append(row)
-                    except: pass
-            elif format_type == "Text":
+            with open(REPORT_CACHE_FILE, 'r') as f: return json.load(f)
+        except: return {}
+
+    @staticmethod
+    def _save_cache(cache):
+        os.makedirs(os.path.dirname(REPORT_CACHE_FILE), exist_ok=True)
+        tmp = REPORT_CACHE_FILE + ".tmp"
+        with open(tmp, 'w') as f: json.dump(cache, f)
+        os.replace(tmp, REPORT_CACHE_FILE)
+
+    @staticmethod
+    def _store_sources(run_id):
+        """Groups one run's outputs into {host: [(name, result_id), ...]}; outputs are streamed later."""
+        hosts = {}
+        for rid, h, seq, cmd, ext in ReportGenerator._store().entries(run_id):
+            hosts.setdefault(h, []).append((f"{seq:02d}_{NetworkRunner.command_slug(cmd)}.{ext}", rid))
+        return hosts
+
+    @staticmethod
+    def generate_excel_report(format_type, regex_excel_path=None, output_format="xlsx", workers=None, run_id=None, xpath_spec_path=None):
+        """Builds Final_Report_<format>.<xlsx|csv|parquet> from one run in the results store (the
+        latest one by default). A host whose stored outputs (by content hash) and column sheet are
+        unchanged since the last report is served from the on-disk cache; the rest are streamed from
+        the store, through a process pool when there are enough of them. XML reports use the XPath column sheet when one is
+        given, otherwise the leaf children of each reply's root."""
+        from .store import RESULTS_DB
+        try:
+            if not os.path.exists(RESULTS_DB): return False, "No results store found."
+            if output_format not in ReportGenerator.OUTPUT_FORMATS: return False, f"Unknown report format: {output_format}"
+            patterns = []
+            if format_type == "Text":
                 if not regex_excel_path: return False, "Regex file missing."
-                regex_df = pd.read_excel(regex_excel_path)
-                patterns = dict(zip(regex_df['Column'], regex_df['Regex']))
-                files = glob.glob("results/*.txt")
-                for f in files:
-                    with open(f, 'r') as tf:
-                        content = tf.read()
-                        row = {'Device_IP': os.path.basename(f).replace('.txt','')}
-                        for col, pat in patterns.items():
-                            match = re.search(pat, content, re.MULTILINE)
-                            row[col] = match.group(1) if match and match.groups() else (match.group(0) if match else "N/A")
-                        data_rows.append(row)
+                patterns = ReportGenerator.load_patterns(regex_excel_path)
+            elif format_type == "XML" and xpath_spec_path:
+                patterns = ReportGenerator.load_xpaths(xpath_spec_path)
+                XPathExtractor.for_spec(patterns)  # unknown prefixes fail here, not per host
+            run_id = run_id or ReportGenerator._store().latest_run()
+            if not run_id: return False, "No runs in the results store."
+            hosts, cache = ReportGenerator._store_sources(run_id), ReportGenerator._load_cache()
+            pattern_hash = hashlib.sha1(json.dumps(patterns, sort_keys=True).encode()).hexdigest()
+            rows, todo, fresh = {}, {}, {}
+            for host, sources in hosts.items():
+                key = f"{format_type}:{host}"
+                sig = [[name, ReportGenerator._store().digest(rid)] for name, rid in sources]
+                entry = cache.get(key)
+                if entry and entry['sig'] == sig and entry['patterns'] == pattern_hash: rows[host] = entry['row']
+                else: todo[host], fresh[key] = sources, {'sig': sig, 'patterns': pattern_hash}
+
+            if len(todo) >= ReportGenerator.POOL_THRESHOLD:
+                from concurrent.futures import ProcessPoolExecutor
+                names = list(todo)
+                batches = [[(h, todo[h]) for h in names[i:i + 16]] for i in range(0, len(names), 16)]
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = pool.map(ReportGenerator._extract_batch, [format_type] * len(batches), batches, [patterns] * len(batches))
+                    parsed = dict(zip(names, (row for batch in results for row in batch)))
+            else: parsed = {h: ReportGenerator._extract_host(format_type, h, f, patterns) for h, f in todo.items()}
 
+            rows.update(parsed)
+            for host, row in parsed.items(): fresh[f"{format_type}:{host}"]['row'] = row
+            cache = {k: v for k, v in cache.items() if not k.startswith(f"{format_type}:") or k.split(":", 1)[1] in hosts}
+            cache.update(fresh)
+            ReportGenerator._save_cache(cache)
+
+            data_rows = [ReportGenerator._flatten(r) for h in sorted(rows) if rows[h]
+                         for r in (rows[h] if isinstance(rows[h], list) else [rows[h]])]
             if not data_rows: return False, "No data extracted."
-            df = pd.json_normalize(data_rows)
-            out = f"Final_Report_{format_type}.xlsx"
-            df.to_excel(out, index=False)
-            return True, out
-        except Exception as e: return False, str(e)
\ No newline at end of file
+            out = f"Final_Report_{format_type}.{output_format}"
+            ReportGenerator._write(data_rows, out, output_format)
+            return True, f"{out} ({len(data_rows)} rows, {len(todo)} parsed, {len(hosts) - len(todo)} cached)"
+        except Exception as e: return False, str(e)
+        finally: ReportGenerator._close_store()
@@ -0,0 +1,68 @@
+import os
+import time
+from .jsoncache import JsonCache
+
+PLATFORMS_FILE = os.path.join(".collexa_cache", "platforms.json")
+DEFAULT_DETECT_TTL_DAYS = 30
+
+# NETCONF capability URI fragment -> (ncclient device handler, netmiko device_type)
+NETCONF_HINTS = (
+    ("xml.juniper.net",                    ("junos", "juniper_junos")),
+    ("cisco.com/ns/yang/Cisco-IOS-XR",     ("iosxr", "cisco_xr")),
+    ("cisco.com/ns/yang/Cisco-IOS-XE",     ("iosxe", "cisco_xe")),
+    ("cisco.com/ns/yang/cisco-nx-os",      ("nexus", "cisco_nxos")),
+    ("nokia.com/sros",                     ("sros", "nokia_sros")),
+    ("huawei.com/netconf",                 ("huawei", "huawei")),
+)
+CAPABILITY_FLAGS = {":candidate": "candidate", ":writable-running": "writable-running", ":validate": "validate",
+                    ":confirmed-commit": "confirmed-commit", ":rollback-on-error": "rollback-on-error"}
+# Errors that usually mean the session was opened with the wrong netmiko driver
+MISMATCH_ERRORS = ("pattern not detected", "search pattern never detected", "invalid input", "unknown command",
+                   "unrecognized command", "syntax error")
+
+def netconf_hint(capabilities):
+    """Platform hint from a NETCONF hello: {'netconf': handler, 'device_type': ..., 'caps': [...]}."""
+    caps = list(capabilities)
+    hint = {'netconf': "default", 'device_type': None,
+            'caps': sorted({flag for cap in caps for key, flag in CAPABILITY_FLAGS.items() if key in cap})}
+    for fragment, (handler, dtype) in NETCONF_HINTS:
+        if any(fragment in cap for cap in caps):
+            hint['netconf'], hint['device_type'] = handler, dtype
+            break
+    return hint
+
+def driver_mismatch(detail):
+    text = str(detail or "").lower()
+    return any(w in text for w in MISMATCH_ERRORS)
+
+class PlatformCache(JsonCache):
+    """Detected platform per host (netmiko device_type from an SSH probe, NETCONF handler and
+    capability flags from a hello), persisted as JSON. Entries older than `ttl_days` are ignored,
+    so a host is probed again after a while even if nothing failed."""
+    def __init__(self, path=PLATFORMS_FILE, ttl_days=DEFAULT_DETECT_TTL_DAYS):
+        super().__init__(path)
+        self.ttl = float(ttl_days) * 86400
+
+    def get(self, host):
+        with self._lock: entry = self.hosts.get(host)
+        if not entry or (self.ttl and time.time() - entry.get('ts', 0) > self.ttl): return None
+        return entry
+
+    def record(self, host, source, **fields):
+        """Merges what `source` ('ssh' or 'netconf') learned; an SSH probe's device_type wins over a
+        NETCONF guess."""
+        with self._lock:
+            entry = self.hosts.get(host) or {}
+            if source == 'netconf' and entry.get('source') == 'ssh': fields.pop('device_type', None)
+            if not fields.get('device_type'): fields.pop('device_type', None)
+            # a probe's age is what expires it; a later NETCONF hello does not extend it
+            if fields.get('device_type') or entry.get('source') != 'ssh': entry['ts'] = int(time.time())
+            if fields.get('device_type'): entry['source'] = source
+            entry.update(fields)
+            self.hosts[host] = entry
+            self._dirty = True
+
+    def forget(self, host):
+        with self._lock:
+            entry = self.hosts.get(host)
+            if entry and entry.pop('device_type', None): entry.pop('source', None); self._dirty = True
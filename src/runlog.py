@@ -0,0 +1,111 @@
+import os
+import math
+import json
+import time
+import queue
+import threading
+from .journal import new_run_id
+
+LOG_DIR = "logs"
+
+class LogSink:
+    """Thread-safe hand-off of log lines from worker threads to the GUI. write() only queues the
+    line; the Tk thread collects them in batches with drain()."""
+    def __init__(self):
+        self._q = queue.SimpleQueue()
+
+    def write(self, msg):
+        self._q.put(msg)
+
+    def drain(self, limit=1000):
+        lines = []
+        try:
+            while len(lines) < limit: lines.append(self._q.get_nowait())
+        except queue.Empty: pass
+        return lines
+
+def load_hook(spec):
+    """'package.module:function' -> callable(kind, record) that receives every span and the summary."""
+    import importlib
+    module, _, name = str(spec).partition(":")
+    hook = getattr(importlib.import_module(module), name or "collect")
+    if not callable(hook): raise ValueError(f"Metrics hook {spec} is not callable")
+    return hook
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    return values[max(0, min(len(values) - 1, math.ceil(pct / 100 * len(values)) - 1))]
+
+class RunLog:
+    """Full JSON-lines log of one run (logs/<run id>-<mode>.jsonl): every message, plus one span per
+    device phase (host, phase, status, start offset and duration) and a closing summary. Records are
+    queued and written by a single background thread, which also feeds the optional metrics hook,
+    so workers never wait on the disk or on a collector."""
+    def __init__(self, mode, log_dir=LOG_DIR, hook=None, run_id=None):
+        os.makedirs(log_dir, exist_ok=True)
+        self.run_id = run_id or new_run_id()  # random suffix: runs started in the same second get separate logs
+        self.path = os.path.join(log_dir, f"{self.run_id}-{mode}.jsonl")
+        self.hook, self.t0 = hook, time.monotonic()
+        self._lock = threading.Lock()
+        self.durations, self.counters = {}, {}
+        self._q = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name="collexa-runlog", daemon=True)
+        self._thread.start()
+
+    def message(self, msg, host=None):
+        self._q.put({'ts': round(time.time(), 3), 'host': host, 'msg': msg})
+
+    def phase(self, host, phase, status, duration, detail=None, start=None):
+        """Records one span; `start` is its time.monotonic() start (default: it just ended)."""
+        start = time.monotonic() - duration if start is None else start
+        rec = {'ts': round(time.time(), 3), 'host': host, 'phase': phase, 'status': status,
+               'start': round(start - self.t0, 3), 'duration': round(duration, 3)}
+        if detail: rec['detail'] = str(detail)
+        with self._lock: self.durations.setdefault(phase, []).append(duration)
+        self._q.put(rec)
+
+    def count(self, name, n):
+        """Adds to a byte counter ('output', 'tunnel_up', ...) reported in the summary."""
+        with self._lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self, devices, failed):
+        """Closes the run's metrics: per-phase count/p50/p95/max, devices per minute and byte
+        counters. Returns (summary dict, printable table lines) and logs the dict."""
+        elapsed = time.monotonic() - self.t0
+        with self._lock: durations, counters = {k: sorted(v) for k, v in self.durations.items()}, dict(self.counters)
+        phases = {k: {'count': len(v), 'p50': round(percentile(v, 50), 3), 'p95': round(percentile(v, 95), 3),
+                      'max': round(v[-1], 3)} for k, v in durations.items()}
+        summ = {'devices': devices, 'failed': failed, 'elapsed': round(elapsed, 3),
+                'devices_per_min': round(devices / elapsed * 60, 1) if elapsed else 0.0, 'phases': phases, 'bytes': counters}
+        mb = lambda n: f"{n / 1e6:.2f} MB"
+        lines = [f"SUMMARY: {devices} devices ({failed} failed) in {elapsed:.1f}s, {summ['devices_per_min']} devices/min"
+                 + "".join(f", {k.replace('_', ' ')} {mb(v)}" for k, v in counters.items()),
+                 f"  {'phase':<14}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}"]
+        lines += [f"  {k:<14}{v['count']:>7}{v['p50']:>9.3f}{v['p95']:>9.3f}{v['max']:>9.3f}" for k, v in phases.items()]
+        self._q.put({'ts': round(time.time(), 3), 'summary': summ})
+        return summ, lines
+
+    def _emit(self, rec):
+        kind = 'span' if 'phase' in rec else 'summary' if 'summary' in rec else None
+        if not kind or not self.hook: return None
+        try: self.hook(kind, rec['summary'] if kind == 'summary' else rec)
+        except Exception as e:
+            self.hook = None
+            return {'ts': round(time.time(), 3), 'host': None, 'msg': f"Metrics hook disabled after error: {e}"}
+
+    def _writer(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                batch = [self._q.get()]
+                try:
+                    while len(batch) < 500: batch.append(self._q.get_nowait())
+                except queue.Empty: pass
+                records = [r for r in batch if r is not None]
+                records += [e for e in map(self._emit, records) if e]
+                f.writelines(json.dumps(r) + "\n" for r in records)
+                f.flush()
+                if None in batch: return
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
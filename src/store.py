@@ -0,0 +1,155 @@
+import os
+import codecs
+import json
+import time
+import zlib
+import hashlib
+import tempfile
+import sqlite3
+import threading
+from .journal import SECRET_KEYS, new_run_id
+
+RESULTS_DB = os.path.join("results", "collexa.db")
+
+class ResultsStore:
+    """Append-only SQLite store of retrieve outputs, keyed by run id, host, command and time.
+    One connection is shared by the worker threads; writes are serialized and committed per device."""
+    CHUNK = 1 << 20
+
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, started REAL, mode TEXT,
+                                             protocol TEXT, format TEXT, params TEXT);
+            CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY, run_id TEXT, host TEXT, seq INTEGER,
+                                                command TEXT, ts REAL, ext TEXT, output BLOB);
+            CREATE INDEX IF NOT EXISTS idx_results_run_host ON results (run_id, host);
+        """)
+        self._db.commit()
+
+    def start_run(self, params, run_id=None):
+        """Registers a run (or keeps the existing row when a journaled run is resumed under its id)."""
+        run_id = run_id or new_run_id()
+        safe = {k: v for k, v in params.items() if k not in SECRET_KEYS and isinstance(v, (str, int, float, bool))}
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                             (run_id, time.time(), params.get('mode'), params.get('protocol'), params.get('format'), json.dumps(safe)))
+            self._db.commit()
+        return run_id
+
+    def add_files(self, run_id, host, outputs, ext):
+        """Stores one device's spooled outputs [(command, path), ...], compressing each file in
+        chunks and writing it with incremental blob I/O so the output is never held in memory."""
+        now = time.time()
+        with self._lock:
+            for seq, (cmd, path) in enumerate(outputs, 1):
+                with tempfile.TemporaryFile() as packed:
+                    comp = zlib.compressobj(6)
+                    with open(path, 'rb') as src:
+                        for chunk in iter(lambda: src.read(self.CHUNK), b""): packed.write(comp.compress(chunk))
+                    packed.write(comp.flush())
+                    size = packed.tell(); packed.seek(0)
+                    if hasattr(self._db, 'blobopen'):
+                        cur = self._db.execute("INSERT INTO results (run_id, host, seq, command, ts, ext, output) VALUES (?, ?, ?, ?, ?, ?, zeroblob(?))",
+                                               (run_id, host, seq, cmd, now, ext, size))
+                        with self._db.blobopen("results", "output", cur.lastrowid) as blob:
+                            for chunk in iter(lambda: packed.read(self.CHUNK), b""): blob.write(chunk)
+                    else:
+                        self._db.execute("INSERT INTO results (run_id, host, seq, command, ts, ext, output) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                         (run_id, host, seq, cmd, now, ext, packed.read()))
+            self._db.commit()
+
+    def add(self, run_id, host, outputs, ext):
+        """Stores one device's outputs: [(command, text), ...] in command order."""
+        now = time.time()
+        rows = [(run_id, host, seq, cmd, now, ext, zlib.compress(out.encode('utf-8'), 6))
+                for seq, (cmd, out) in enumerate(outputs, 1)]
+        with self._lock:
+            self._db.executemany("INSERT INTO results (run_id, host, seq, command, ts, ext, output) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def discard(self, run_id, host):
+        """Drops a host's outputs from a run before it is retrieved again."""
+        with self._lock:
+            self._db.execute("DELETE FROM results WHERE run_id = ? AND host = ?", (run_id, host))
+            self._db.commit()
+
+    def runs(self, limit=20):
+        with self._lock:
+            return self._db.execute("SELECT run_id, started, mode, protocol, format FROM runs ORDER BY started DESC LIMIT ?", (limit,)).fetchall()
+
+    def latest_run(self):
+        runs = self.runs(1)
+        return runs[0][0] if runs else None
+
+    def entries(self, run_id):
+        """Yields (result_id, host, seq, command, ext) for a run without loading any output."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, host, seq, command, ext FROM results WHERE run_id = ? ORDER BY host, seq, id", (run_id,)).fetchall()
+        yield from rows
+
+    def iter_output(self, result_id):
+        """Streams one stored output back as decoded text chunks, reading the blob incrementally."""
+        decomp = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        for part in self._read_blob(result_id):
+            while part:
+                text = decoder.decode(decomp.decompress(part, self.CHUNK))
+                part = decomp.unconsumed_tail
+                if text: yield text
+        tail = decoder.decode(decomp.flush(), final=True)
+        if tail: yield tail
+
+    def spool_output(self, result_id, out):
+        """Decompresses one stored output into the binary file `out` chunk by chunk; returns its size."""
+        decomp = zlib.decompressobj()
+        for part in self._read_blob(result_id):
+            while part:
+                out.write(decomp.decompress(part, self.CHUNK))
+                part = decomp.unconsumed_tail
+        out.write(decomp.flush())
+        return out.tell()
+
+    def digest(self, result_id):
+        """Content hash of one stored output, taken over its compressed blob."""
+        h = hashlib.sha1()
+        for part in self._read_blob(result_id): h.update(part)
+        return h.hexdigest()
+
+    def _read_blob(self, result_id):
+        if not hasattr(self._db, 'blobopen'):
+            with self._lock: packed = self._db.execute("SELECT output FROM results WHERE id = ?", (result_id,)).fetchone()[0]
+            yield packed
+            return
+        with self._lock: blob = self._db.blobopen("results", "output", result_id, readonly=True)
+        try:
+            while True:
+                with self._lock: part = blob.read(self.CHUNK)
+                if not part: break
+                yield part
+        finally:
+            with self._lock: blob.close()
+
+    def export(self, run_id, out_dir="results", format_type=None):
+        """Writes a run back out as per-host files (results/<host>.<ext>, or results/<host>/NN_<cmd>.<ext>
+        for multi-command hosts), pretty-printing JSON/XML on the way when format_type is given.
+        Returns the number of files written."""
+        from .models import NetworkRunner, OutputFormatter
+        entries = list(self.entries(run_id))
+        per_host = {}
+        for _, h, _, _, _ in entries: per_host[h] = per_host.get(h, 0) + 1
+        for rid, h, seq, cmd, ext in entries:
+            if per_host[h] == 1: path = os.path.join(out_dir, f"{h}.{ext}")
+            else:
+                os.makedirs(os.path.join(out_dir, h), exist_ok=True)
+                path = os.path.join(out_dir, h, f"{seq:02d}_{NetworkRunner.command_slug(cmd)}.{ext}")
+            with open(path, "w") as f: OutputFormatter.write(lambda: self.iter_output(rid), f, format_type)
+        return len(entries)
+
+    def close(self):
+        with self._lock: self._db.close()
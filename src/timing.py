@@ -0,0 +1,81 @@
+import os
+import time
+from .jsoncache import JsonCache
+
+LATENCY_FILE = os.path.join(".collexa_cache", "latency.json")
+TIMING_MODES = ("adaptive", "profile", "conservative")
+
+# netmiko connection settings + the per-command read timeout (seconds of silence tolerated)
+CONSERVATIVE = {'global_delay_factor': 4, 'fast_cli': False, 'conn_timeout': 20, 'read_timeout': 90}
+TIMING_PROFILES = {
+    'default':       {'global_delay_factor': 2, 'fast_cli': True, 'conn_timeout': 15, 'read_timeout': 60},
+    'cisco_ios':     {'global_delay_factor': 1, 'fast_cli': True, 'conn_timeout': 10, 'read_timeout': 45},
+    'cisco_xe':      {'global_delay_factor': 1, 'fast_cli': True, 'conn_timeout': 10, 'read_timeout': 45},
+    'cisco_nxos':    {'global_delay_factor': 1, 'fast_cli': True, 'conn_timeout': 10, 'read_timeout': 45},
+    'cisco_xr':      {'global_delay_factor': 2, 'fast_cli': True, 'conn_timeout': 15, 'read_timeout': 60},
+    'juniper_junos': {'global_delay_factor': 1, 'fast_cli': True, 'conn_timeout': 10, 'read_timeout': 60},
+    'arista_eos':    {'global_delay_factor': 1, 'fast_cli': True, 'conn_timeout': 10, 'read_timeout': 45},
+    'nokia_sros':    {'global_delay_factor': 2, 'fast_cli': True, 'conn_timeout': 15, 'read_timeout': 60},
+    'huawei':        {'global_delay_factor': 2, 'fast_cli': True, 'conn_timeout': 15, 'read_timeout': 60},
+}
+AGGRESSIVE = {'global_delay_factor': 0.5, 'fast_cli': True}
+
+class LatencyBook(JsonCache):
+    """Per-host connect, prompt and response latency learned from earlier runs (EWMA, seconds),
+    persisted as JSON. A timeout is remembered until the host next completes cleanly."""
+    ALPHA = 0.3
+
+    def __init__(self, path=LATENCY_FILE):
+        super().__init__(path)
+
+    def get(self, host):
+        with self._lock: return self.hosts.get(host)
+
+    def record(self, host, device_type, timings, ok):
+        with self._lock:
+            h = self.hosts.setdefault(host, {'samples': 0, 'timeouts': 0})
+            for key in ('connect', 'prompt', 'response'):
+                if timings.get(key) is None: continue
+                h[key] = round(timings[key] if key not in h else (1 - self.ALPHA) * h[key] + self.ALPHA * timings[key], 3)
+            h['samples'] += 1
+            h['timeouts'] = h['timeouts'] + 1 if timings.get('timed_out') else 0 if ok else h['timeouts']
+            h['device_type'], h['updated'] = device_type, int(time.time())
+            self._dirty = True
+
+class TimingPolicy:
+    """Chooses netmiko timings per device. 'conservative' is the old fixed 4x / 90 s; 'profile' uses the
+    platform profile; 'adaptive' starts from the profile and moves hosts with learned latency to
+    aggressive timings when they answer fast, or to conservative ones when they are slow or timed out."""
+    FAST, SLOW, SLOW_CONNECT = 0.5, 5.0, 8.0
+    MIN_READ_TIMEOUT = 20
+
+    def __init__(self, mode="adaptive"):
+        self.mode = mode if mode in TIMING_MODES else "adaptive"
+        self.book = LatencyBook() if self.mode == "adaptive" else None
+
+    @staticmethod
+    def profile(device_type):
+        return TIMING_PROFILES.get(str(device_type).replace("_ssh", ""), TIMING_PROFILES['default'])
+
+    def for_device(self, device_type, host):
+        """(name, settings): netmiko connect kwargs plus 'read_timeout' for each command."""
+        if self.mode == "conservative": return "conservative", dict(CONSERVATIVE)
+        base = dict(self.profile(device_type))
+        seen = self.book.get(host) if self.book else None
+        if not seen: return "profile", base
+        if seen['timeouts'] or seen.get('response', 0) > self.SLOW or seen.get('connect', 0) > self.SLOW_CONNECT:
+            return "learned-slow", dict(CONSERVATIVE)
+        if 'response' not in seen: return "profile", base
+        if seen['response'] < self.FAST and seen.get('prompt', 0) < self.FAST:
+            read_timeout = min(base['read_timeout'], max(self.MIN_READ_TIMEOUT, round(20 * seen['response'])))
+            return "learned-fast", dict(base, **AGGRESSIVE, read_timeout=read_timeout)
+        return "profile", base
+
+    def learn(self, host, device_type, timings, ok):
+        if self.book and timings: self.book.record(host, device_type, timings, ok)
+
+    def save(self):
+        if self.book: self.book.save()
+
+    def describe(self):
+        return self.mode + (f" ({len(self.book.hosts)} hosts learned)" if self.book else "")
@@ -1,21 +1,28 @@
 import customtkinter as ctk
 from tkinter import filedialog
-from PIL import Image
+from PIL import Image, ImageChops
 import os
 import sys
 import ctypes
-from .controller import AppController
+from .controller import AppController, DEFAULT_WORKERS, DEFAULT_JUMP_LIMIT
+from .runlog import LogSink
+from .journal import RunJournal
+from .deadline import DEFAULT_DEVICE_TIMEOUT
 
 # --- BRAND COLORS ---
 COLLEXA_RED = "#D32F2F"    
 COLLEXA_DARK_BG = "#1a1a1a"
 COLLEXA_LIGHT_BG = "#F0F0F0"
 
+LOG_POLL_MS = 100
+LOG_MAX_LINES = 5000
+
 class CollexaView(ctk.CTk):
     def __init__(self):
         super().__init__()
         
-        self.controller = AppController(self.log)
+        self.log_sink = LogSink()
+        self.controller = AppController(self.log_sink.write)
 
         try: ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID('collexa.netdeploy.1.0')
         except: pass
@@ -29,10 +36,11 @@ class CollexaView(ctk.CTk):
         self.grid_rowconfigure(0, weight=1)
         
         self._build_ui()
-        self._load_creds()
+        self.after_idle(self._load_creds)
         
         # Default Theme
         self.change_theme("Dark")
+        self.after(LOG_POLL_MS, self._drain_log)
 
     def _get_asset(self, name):
         if getattr(sys, 'frozen', False): base = sys._MEIPASS
@@ -46,18 +54,15 @@ class CollexaView(ctk.CTk):
         except: pass
 
     def _create_dark_mode_logo(self, img_path):
-        """Converts black pixels to white for dark mode."""
+        """Converts black pixels to white for dark mode (whole-image band ops, no per-pixel loop)."""
         img = Image.open(img_path).convert("RGBA")
-        datas = img.getdata()
-        new_data = []
-        for item in datas:
-            # If pixel is dark (Black/Grey), turn White
-            if item[0] < 80 and item[1] < 80 and item[2] < 80:
-                new_data.append((255, 255, 255, item[3]))
-            else:
-                new_data.append(item)
-        img.putdata(new_data)
-        return img
+        r, g, b, a = img.split()
+        # If pixel is dark (Black/Grey) in all three channels, turn White
+        dark = lambda band: band.point(lambda v: 255 if v < 80 else 0)
+        mask = ImageChops.multiply(ImageChops.multiply(dark(r), dark(g)), dark(b))
+        white = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        white.putalpha(a)
+        return Image.composite(white, img, mask)
 
     def _build_ui(self):
         self.main_panel = ctk.CTkFrame(self, fg_color="transparent")
@@ -104,7 +109,7 @@ class CollexaView(ctk.CTk):
                                           button_color=COLLEXA_RED, border_color=COLLEXA_RED)
         self.mode_combo.grid(row=0, column=1, padx=10, pady=(20, 5), sticky="w")
 
-        ctk.CTkLabel(files_frame, text="Target List (Excel)").grid(row=1, column=0, padx=20, pady=5, sticky="w")
+        ctk.CTkLabel(files_frame, text="Target List (Excel/CSV/YAML)").grid(row=1, column=0, padx=20, pady=5, sticky="w")
         self.entry_excel = ctk.CTkEntry(files_frame)
         self.entry_excel.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
         ctk.CTkButton(files_frame, text="Browse", width=80, fg_color=COLLEXA_RED, hover_color="#B71C1C", 
@@ -115,11 +120,39 @@ class CollexaView(ctk.CTk):
         self.entry_template = ctk.CTkEntry(files_frame)
         self.btn_tmpl = ctk.CTkButton(files_frame, text="Browse", width=80, fg_color=COLLEXA_RED, command=lambda: self.browse_file(self.entry_template))
         
-        self.lbl_cmd = ctk.CTkLabel(files_frame, text="Command to Run")
-        self.entry_cmd = ctk.CTkEntry(files_frame, placeholder_text="e.g. show version")
+        self.render_frame = ctk.CTkFrame(files_frame, fg_color="transparent")
+        self.prerender_var = ctk.BooleanVar(value=False)
+        self.dry_run_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(self.render_frame, text="Pre-render All Configs First", variable=self.prerender_var,
+                        fg_color=COLLEXA_RED, hover_color=COLLEXA_RED).pack(side="left", padx=(0,20))
+        ctk.CTkCheckBox(self.render_frame, text="Dry Run (render only)", variable=self.dry_run_var,
+                        fg_color=COLLEXA_RED, hover_color=COLLEXA_RED).pack(side="left")
+        ctk.CTkLabel(self.render_frame, text="Diff:").pack(side="left", padx=(20,5))
+        self.diff_combo = ctk.CTkComboBox(self.render_frame, values=["off", "cache", "running"], width=100,
+                                          button_color=COLLEXA_RED, border_color=COLLEXA_RED)
+        self.diff_combo.set("off")
+        self.diff_combo.pack(side="left")
+        ctk.CTkLabel(self.render_frame, text="Transfer:").pack(side="left", padx=(20,5))
+        self.transfer_combo = ctk.CTkComboBox(self.render_frame, values=["interactive", "auto", "bulk"], width=120,
+                                              button_color=COLLEXA_RED, border_color=COLLEXA_RED)
+        self.transfer_combo.set("interactive")
+        self.transfer_combo.pack(side="left")
+
+        self.nc_push_frame = ctk.CTkFrame(files_frame, fg_color="transparent")
+        ctk.CTkLabel(self.nc_push_frame, text="Datastore:").pack(side="left", padx=(0,10))
+        self.nc_target = ctk.CTkComboBox(self.nc_push_frame, values=["auto", "running", "candidate"], width=110,
+                                         button_color=COLLEXA_RED, border_color=COLLEXA_RED)
+        self.nc_target.set("auto")
+        self.nc_target.pack(side="left")
+        self.entry_confirm = ctk.CTkEntry(self.nc_push_frame, placeholder_text="Confirm timeout (s)", width=140)
+        self.entry_confirm.pack(side="left", padx=20)
+
+        self.lbl_cmd = ctk.CTkLabel(files_frame, text="Commands to Run")
+        self.entry_cmd = ctk.CTkEntry(files_frame, placeholder_text="e.g. show version; show ip int brief (or a .txt file)")
+        self.btn_cmd = ctk.CTkButton(files_frame, text="Browse", width=80, fg_color=COLLEXA_RED, command=lambda: self.browse_file(self.entry_cmd))
 
         self.lbl_nc = ctk.CTkLabel(files_frame, text="Filter (XML/JSON)")
-        self.entry_nc = ctk.CTkEntry(files_frame, placeholder_text="Path to .xml or .json filter")
+        self.entry_nc = ctk.CTkEntry(files_frame, placeholder_text="Path to .xml or .json filter (several: a.xml; get:state.xml)")
         self.btn_nc = ctk.CTkButton(files_frame, text="Browse", width=80, fg_color=COLLEXA_RED, command=lambda: self.browse_file(self.entry_nc))
         
         self.format_frame = ctk.CTkFrame(files_frame, fg_color="transparent")
@@ -133,6 +166,13 @@ class CollexaView(ctk.CTk):
         self.chk_convert = ctk.CTkCheckBox(self.format_frame, text="Auto-Convert to Excel", variable=self.convert_var,
                                            fg_color=COLLEXA_RED, hover_color=COLLEXA_RED)
         self.chk_convert.pack(side="left", padx=20)
+        self.report_fmt = ctk.CTkComboBox(self.format_frame, values=["xlsx", "csv", "parquet"], width=90,
+                                          button_color=COLLEXA_RED, border_color=COLLEXA_RED)
+        self.report_fmt.set("xlsx")
+        self.report_fmt.pack(side="left")
+        self.export_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(self.format_frame, text="Per-Host Files", variable=self.export_var,
+                        fg_color=COLLEXA_RED, hover_color=COLLEXA_RED).pack(side="left", padx=20)
 
         self.regex_frame = ctk.CTkFrame(files_frame, fg_color="transparent")
         ctk.CTkLabel(self.regex_frame, text="Regex Excel").pack(side="left")
@@ -141,6 +181,13 @@ class CollexaView(ctk.CTk):
         ctk.CTkButton(self.regex_frame, text="Browse", width=60, fg_color=COLLEXA_RED, 
                       command=lambda: self.browse_file(self.entry_regex)).pack(side="left")
 
+        self.xpath_frame = ctk.CTkFrame(files_frame, fg_color="transparent")
+        ctk.CTkLabel(self.xpath_frame, text="XPath Columns").pack(side="left")
+        self.entry_xpath = ctk.CTkEntry(self.xpath_frame, placeholder_text="Optional .xlsx/.csv: Column, XPath, Type (row)")
+        self.entry_xpath.pack(side="left", fill="x", expand=True, padx=5)
+        ctk.CTkButton(self.xpath_frame, text="Browse", width=60, fg_color=COLLEXA_RED,
+                      command=lambda: self.browse_file(self.entry_xpath)).pack(side="left")
+
         # === 2. SETTINGS ===
         settings_grid = ctk.CTkFrame(self.main_panel, fg_color="transparent")
         settings_grid.grid(row=2, column=0, sticky="ew", pady=5)
@@ -159,6 +206,17 @@ class CollexaView(ctk.CTk):
         self.vendor_combo = ctk.CTkComboBox(p_frame, values=["Cisco IOS", "Cisco XR", "Juniper Junos", "Nokia SR OS", "Huawei VRP"],
                                             button_color=COLLEXA_RED, border_color=COLLEXA_RED)
         self.vendor_combo.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
+        self.autodetect_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(p_frame, text="Autodetect (cached per host)", variable=self.autodetect_var,
+                        fg_color=COLLEXA_RED, hover_color=COLLEXA_RED).grid(row=2, column=1, padx=(0,20), pady=10, sticky="w")
+        self.entry_workers = ctk.CTkEntry(p_frame, placeholder_text=f"Parallel Devices ({DEFAULT_WORKERS})")
+        self.entry_workers.grid(row=3, column=0, padx=20, pady=(0,10), sticky="ew")
+        self.timing_combo = ctk.CTkComboBox(p_frame, values=["adaptive", "profile", "conservative"],
+                                            button_color=COLLEXA_RED, border_color=COLLEXA_RED)
+        self.timing_combo.set("adaptive")
+        self.timing_combo.grid(row=4, column=0, padx=20, pady=(0,10), sticky="ew")
+        self.entry_deadline = ctk.CTkEntry(p_frame, placeholder_text=f"Device Deadline s ({DEFAULT_DEVICE_TIMEOUT}, 0 = off)")
+        self.entry_deadline.grid(row=5, column=0, padx=20, pady=(0,10), sticky="ew")
 
         # Credentials & Theme
         c_frame = ctk.CTkFrame(settings_grid, border_color="gray", border_width=2)
@@ -192,17 +250,33 @@ class CollexaView(ctk.CTk):
         ctk.CTkCheckBox(j_frame, text="Use Jump Host", variable=self.use_jump, command=self.toggle_jump,
                         fg_color=COLLEXA_RED).grid(row=0, column=0, padx=20, pady=(20,10))
         
-        self.jh_host = ctk.CTkEntry(j_frame, placeholder_text="Jump IP"); self.jh_host.grid(row=0, column=1, padx=5)
+        self.jh_host = ctk.CTkEntry(j_frame, placeholder_text="Jump IP(s)"); self.jh_host.grid(row=0, column=1, padx=5)
         self.jh_port = ctk.CTkEntry(j_frame, placeholder_text="22", width=50); self.jh_port.grid(row=0, column=2, padx=5)
         self.jh_user = ctk.CTkEntry(j_frame, placeholder_text="User"); self.jh_user.grid(row=0, column=3, padx=5)
         self.jh_pass = ctk.CTkEntry(j_frame, placeholder_text="Pass", show="*"); self.jh_pass.grid(row=0, column=4, padx=5)
+        self.jh_limit = ctk.CTkEntry(j_frame, placeholder_text=f"Max {DEFAULT_JUMP_LIMIT}", width=60); self.jh_limit.grid(row=0, column=5, padx=5)
+        self.jh_direct = ctk.BooleanVar(value=True)
+        self.chk_direct = ctk.CTkCheckBox(j_frame, text="Direct Channel", variable=self.jh_direct, fg_color=COLLEXA_RED)
+        self.chk_direct.grid(row=1, column=1, columnspan=2, padx=5, pady=(0,10), sticky="w")
         self.toggle_jump()
 
         # === 4. ACTION ===
-        self.btn_run = ctk.CTkButton(self.main_panel, text="RUN CONFIGURATION", height=45,
+        action_frame = ctk.CTkFrame(self.main_panel, fg_color="transparent")
+        action_frame.grid(row=4, column=0, sticky="ew", pady=10)
+        action_frame.grid_columnconfigure(0, weight=1)
+        self.btn_run = ctk.CTkButton(action_frame, text="RUN CONFIGURATION", height=45,
                                      font=("Arial", 16, "bold"), fg_color="#008000", hover_color="#006400", 
                                      command=self.on_run) 
-        self.btn_run.grid(row=4, column=0, sticky="ew", pady=10)
+        self.btn_run.grid(row=0, column=0, sticky="ew")
+        self.btn_resume = ctk.CTkButton(action_frame, text="Resume Last", width=110, height=45, fg_color="gray",
+                                        command=lambda: self.on_resume(retry=False))
+        self.btn_resume.grid(row=0, column=1, padx=(10,0))
+        self.btn_retry = ctk.CTkButton(action_frame, text="Retry Failed", width=110, height=45, fg_color="gray",
+                                       command=lambda: self.on_resume(retry=True))
+        self.btn_retry.grid(row=0, column=2, padx=(10,0))
+        self.btn_cancel = ctk.CTkButton(action_frame, text="Cancel", width=90, height=45, fg_color="gray", state="disabled",
+                                        command=self.controller.cancel)
+        self.btn_cancel.grid(row=0, column=3, padx=(10,0))
 
         # === 5. LOGS ===
         self.log_box = ctk.CTkTextbox(self.main_panel, border_color="gray", border_width=1)
@@ -235,15 +309,17 @@ class CollexaView(ctk.CTk):
         proto = self.protocol_var.get()
 
         # Hide all dynamic
-        for w in [self.lbl_tmpl, self.entry_template, self.btn_tmpl,
-                  self.lbl_cmd, self.entry_cmd,
+        for w in [self.lbl_tmpl, self.entry_template, self.btn_tmpl, self.render_frame,
+                  self.lbl_cmd, self.entry_cmd, self.btn_cmd,
                   self.lbl_nc, self.entry_nc, self.btn_nc,
-                  self.format_frame, self.regex_frame]: w.grid_forget()
+                  self.format_frame, self.regex_frame, self.xpath_frame, self.nc_push_frame]: w.grid_forget()
 
         if mode == "Configuration Push":
             self.lbl_tmpl.grid(row=2, column=0, padx=20, pady=5, sticky="w")
             self.entry_template.grid(row=2, column=1, padx=10, pady=5, sticky="ew")
             self.btn_tmpl.grid(row=2, column=2, padx=10, pady=5)
+            self.render_frame.grid(row=3, column=0, columnspan=3, padx=20, pady=5, sticky="w")
+            if proto == "NETCONF": self.nc_push_frame.grid(row=4, column=0, columnspan=3, padx=20, pady=5, sticky="w")
             self.btn_run.configure(text="RUN CONFIGURATION", fg_color="#008000")
         else:
             self.btn_run.configure(text="RETRIEVE DATA", fg_color=COLLEXA_RED)
@@ -252,25 +328,36 @@ class CollexaView(ctk.CTk):
             if proto == "SSH":
                 self.lbl_cmd.grid(row=2, column=0, padx=20, pady=5, sticky="w")
                 self.entry_cmd.grid(row=2, column=1, padx=10, pady=5, sticky="ew")
+                self.btn_cmd.grid(row=2, column=2, padx=10, pady=5)
                 if self.format_var.get() == "Text": self.regex_frame.grid(row=4, column=0, columnspan=3, padx=20, pady=5, sticky="ew")
             elif proto == "NETCONF":
                 self.lbl_nc.grid(row=2, column=0, padx=20, pady=5, sticky="w")
                 self.entry_nc.grid(row=2, column=1, padx=10, pady=5, sticky="ew")
                 self.btn_nc.grid(row=2, column=2, padx=10, pady=5)
+                self.xpath_frame.grid(row=4, column=0, columnspan=3, padx=20, pady=5, sticky="ew")
 
     def toggle_jump(self):
         state = "normal" if self.use_jump.get() else "disabled"
-        for w in [self.jh_host, self.jh_port, self.jh_user, self.jh_pass]: w.configure(state=state)
+        for w in [self.jh_host, self.jh_port, self.jh_user, self.jh_pass, self.jh_limit, self.chk_direct]: w.configure(state=state)
 
     def browse_file(self, entry):
         f = filedialog.askopenfilename()
         if f: entry.delete(0, "end"); entry.insert(0, f)
 
     def log(self, msg):
-        self.log_box.configure(state="normal")
-        self.log_box.insert("end", msg + "\n")
-        self.log_box.see("end")
-        self.log_box.configure(state="disabled")
+        self.log_sink.write(msg)
+
+    def _drain_log(self):
+        """Moves queued log lines into the textbox in one insert, keeping the last LOG_MAX_LINES."""
+        lines = self.log_sink.drain()
+        if lines:
+            self.log_box.configure(state="normal")
+            self.log_box.insert("end", "\n".join(lines) + "\n")
+            excess = int(self.log_box.index("end-1c").split(".")[0]) - 1 - LOG_MAX_LINES
+            if excess > 0: self.log_box.delete("1.0", f"{excess + 1}.0")
+            self.log_box.see("end")
+            self.log_box.configure(state="disabled")
+        self.after(LOG_POLL_MS, self._drain_log)
 
     def _load_creds(self):
         creds = self.controller.load_creds()
@@ -280,19 +367,41 @@ class CollexaView(ctk.CTk):
     def on_run(self):
         params = {
             'excel': self.entry_excel.get(), 'user': self.entry_user.get(), 'pass': self.entry_pass.get(),
-            'protocol': self.protocol_var.get(), 'vendor': self.vendor_combo.get(),
+            'protocol': self.protocol_var.get(), 'vendor': self.vendor_combo.get(), 'autodetect': self.autodetect_var.get(),
             'use_jump': self.use_jump.get(), 'jh_ip': self.jh_host.get(), 'jh_port': self.jh_port.get() or 22,
             'jh_user': self.jh_user.get(), 'jh_pass': self.jh_pass.get(),
             'mode': 'retrieve' if self.mode_var.get() == "Retrieve Data (Show)" else 'push',
             'cmd': self.entry_cmd.get(), 'template': self.entry_template.get(),
-            'netconf_file': self.entry_nc.get(),
-            'format': self.format_var.get(), 'auto_convert': self.convert_var.get(),
-            'regex_file': self.entry_regex.get()
+            'netconf_file': self.entry_nc.get(), 'netconf_target': self.nc_target.get(), 'confirm_timeout': self.entry_confirm.get() or 0, 'push_diff': self.diff_combo.get(), 'push_method': self.transfer_combo.get(),
+            'format': self.format_var.get(), 'auto_convert': self.convert_var.get(), 'report_format': self.report_fmt.get(),
+            'export_files': self.export_var.get(),
+            'regex_file': self.entry_regex.get(), 'xpath_file': self.entry_xpath.get(),
+            'workers': self.entry_workers.get() or DEFAULT_WORKERS, 'jump_limit': self.jh_limit.get() or DEFAULT_JUMP_LIMIT,
+            'tunnel_mode': 'direct' if self.jh_direct.get() else 'listener', 'timing': self.timing_combo.get(),
+            'device_timeout': self.entry_deadline.get() or None,
+            'prerender': self.prerender_var.get() or self.dry_run_var.get(), 'dry_run': self.dry_run_var.get()
         }
         
         if self.save_creds_var.get(): self.controller.save_creds('main', params['user'], params['pass'])
         if self.use_jump.get(): self.controller.save_creds('jump', params['jh_user'], params['jh_pass'])
         
-        self.btn_run.configure(state="disabled")
+        self._start(params)
+
+    def on_resume(self, retry):
+        """Continues the last journaled run with the passwords currently in the form."""
+        try: params = RunJournal.resume_params("last", retry=retry)
+        except ValueError as e: self.log(f"Nothing to resume: {e}"); return
+        params.update({'pass': self.entry_pass.get(), 'jh_pass': self.jh_pass.get()})
+        self._start(params)
+
+    def _start(self, params):
+        for b in (self.btn_run, self.btn_resume, self.btn_retry): b.configure(state="disabled")
+        self.btn_cancel.configure(state="normal", fg_color=COLLEXA_RED)
         self.controller.run_task(params)
-        self.after(2000, lambda: self.btn_run.configure(state="normal"))
\ No newline at end of file
+        self.after(500, self._watch_run)
+
+    def _watch_run(self):
+        """Re-enables the run buttons once the run thread has finished."""
+        if self.controller.busy(): self.after(500, self._watch_run); return
+        for b in (self.btn_run, self.btn_resume, self.btn_retry): b.configure(state="normal")
+        self.btn_cancel.configure(state="disabled", fg_color="gray")
\ No newline at end of file